@@ -1,13 +1,260 @@
 import chess
+import chess.polyglot
 import random
 import time
 import math
+import itertools
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Integer search bounds; mate scores stay well inside them
+INF = 10 ** 9
+MATE_SCORE = 10000
+
+# Number of transposition-table slots (a power of two)
+TT_SIZE = 1 << 18
+
+# Transposition-table bound flags
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+# Scores beyond this are mates; the TT stores them relative to the node
+# rather than the root, so they stay valid in later searches
+_MATE_BOUND = MATE_SCORE - 1000
+
+# Move-ordering piece values indexed by piece type (chess.PAWN .. chess.KING)
+_PIECE_VALUES = (0, 1, 3, 3, 5, 9, 100)
+
+def _phase_bonuses(non_king_non_pawn):
+    # As pieces drop off, the multiplier goes from 1.0 up to ~2.0
+    endgame_factor = max(0.0, (10 - non_king_non_pawn) / 10.0)
+    multiplier = 1.0 + endgame_factor
+    return int(1200 * multiplier), int(200 * multiplier)
+
+# (promotion bonus, pre-promotion push bonus) per non-pawn, non-king piece count
+_PHASE_BONUSES = tuple(_phase_bonuses(count) for count in range(33))
+
+# Half-width of the aspiration window used from depth 3 on
+_ASPIRATION_WINDOW = 50
+
+# Depth reduction for the null-move search
+_NULL_MOVE_R = 2
+
+# Upper bound on the history-heuristic bonus in move ordering
+_HISTORY_CAP = 25
+# Moves picked one at a time by order_moves before it sorts the remainder
+_SELECTION_PICKS = 3
+
+# d4, e4, d5, e5
+_CENTER_SQUARES = chess.BB_D4 | chess.BB_E4 | chess.BB_D5 | chess.BB_E5
+
+# Process pools for root-parallel searches, keyed by worker count, each with
+# the shared id of the search its workers may run (-1: none)
+_ROOT_POOLS = {}
+# Ids of root-parallel searches, so a worker process unpickles each search's
+# engine and board once; the worker side keeps the last one it saw
+_ROOT_SEARCH_IDS = itertools.count()
+_worker_search = None
+# Worker side: the pool's shared live-search id, set by _init_root_worker
+_worker_live_search = None
+# Seconds between stop-flag checks while waiting on root-move workers
+_ROOT_POLL_INTERVAL = 0.05
+
+def _get_root_pool(workers):
+    # Spawned (not forked) workers, so the GUI's threads and SDL state never
+    # get duplicated into the child processes
+    entry = _ROOT_POOLS.get(workers)
+    if entry is None:
+        context = multiprocessing.get_context("spawn")
+        live_search = context.RawValue("q", -1)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_init_root_worker, initargs=(live_search,))
+        entry = _ROOT_POOLS[workers] = (pool, live_search)
+    return entry
+
+def _shutdown_root_pools():
+    # Stop the root moves still running and drop the queued ones. Hooked in
+    # ahead of concurrent.futures' own exit handler, which joins the pools:
+    # a plain atexit hook only runs after that join has waited them out
+    for pool, live_search in _ROOT_POOLS.values():
+        live_search.value = -1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+threading._register_atexit(_shutdown_root_pools)
+
+def _init_root_worker(live_search):
+    global _worker_live_search
+    _worker_live_search = live_search
+
+class _RootSearchStop:
+    # Worker-side stop flag: set once the parent moves on from this search,
+    # cancelling it or starting another
+    def __init__(self, search_id):
+        self.search_id = search_id
+
+    def is_set(self):
+        return _worker_live_search.value != self.search_id
+
+def _iter_ordered(moves, scores):
+    # Yield moves best score first. A cutoff usually comes within the first
+    # few moves, so the leaders are selected on demand and the rest is only
+    # sorted if the search gets that far. Ties keep their original order.
+    key = scores.__getitem__
+    remaining = list(range(len(moves)))
+    for _ in range(min(len(remaining), _SELECTION_PICKS)):
+        best = max(remaining, key=key)
+        remaining.remove(best)
+        yield moves[best]
+    remaining.sort(key=key, reverse=True)
+    for i in remaining:
+        yield moves[i]
+
+def _search_root_move(search_id, payload, move, depth, alpha):
+    # Worker entry point: score a single root move, which only has to be
+    # resolved exactly if it beats alpha (the best root score so far)
+    global _worker_search
+    if _worker_search is None or _worker_search[0] != search_id:
+        _worker_search = (search_id,) + pickle.loads(payload)
+    _, engine, board = _worker_search
+    engine.stop_flag = _RootSearchStop(search_id)
+    engine.reset_stats()
+    board.push(move)
+    try:
+        score = -engine.negamax(board, depth - 1, -INF, -alpha, 1)
+    finally:
+        board.pop()
+    return score, engine.nodes_evaluated
+
+# Castling, en passant and turn keys of the polyglot hash
+_ZOBRIST = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+_ZOBRIST_TURN = chess.polyglot.POLYGLOT_RANDOM_ARRAY[780]
+
+class ZobristBoard(chess.Board):
+    """Board that keeps its polyglot Zobrist hash (`zkey`) up to date on push/pop"""
+
+    def __init__(self, fen=chess.STARTING_FEN, *, chess960=False):
+        super().__init__(fen, chess960=chess960)
+        self.zkey = chess.polyglot.zobrist_hash(self)
+        self.zkey_stack = []
+
+    @classmethod
+    def from_board(cls, board):
+        """Copy `board` into a ZobristBoard, with only the moves since the last
+        capture or pawn move: nothing before them can repeat"""
+        zboard = cls(board.fen(en_passant="fen"), chess960=board.chess960)
+        plies = min(board.halfmove_clock, len(board.move_stack))
+        if plies:
+            zboard.move_stack = board.move_stack[-plies:]
+            zboard._stack = board._stack[-plies:]
+        return zboard
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board.zkey = self.zkey
+        board.zkey_stack = self.zkey_stack[max(0, len(self.zkey_stack) - len(board.move_stack)):]
+        return board
+
+    def piece_keys(self, mask):
+        """XOR of the piece keys for every piece standing on `mask`"""
+        keys = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+        white = self.occupied_co[chess.WHITE]
+        key = 0
+        for square in chess.scan_reversed(self.occupied & mask):
+            piece_index = (self.piece_type_at(square) - 1) * 2 + bool(white & chess.BB_SQUARES[square])
+            key ^= keys[64 * piece_index + square]
+        return key
+
+    def push(self, move):
+        from_sq = move.from_square
+        to_sq = move.to_square
+
+        # Only these squares can change: the move's own two, plus the rook
+        # when a king castles and the captured pawn on en passant
+        mask = chess.BB_SQUARES[from_sq] | chess.BB_SQUARES[to_sq]
+        if self.kings & chess.BB_SQUARES[from_sq]:
+            mask |= chess.BB_RANKS[chess.square_rank(from_sq)]
+        elif to_sq == self.ep_square and self.pawns & chess.BB_SQUARES[from_sq]:
+            mask |= chess.BB_SQUARES[to_sq - 8 if self.turn == chess.WHITE else to_sq + 8]
+
+        # Castling rights can only drop when a king or corner rook is involved
+        castling = self.castling_rights & mask
+
+        key = self.zkey ^ self.piece_keys(mask) ^ _ZOBRIST_TURN
+        if castling:
+            key ^= _ZOBRIST.hash_castling(self)
+        if self.ep_square is not None:
+            key ^= _ZOBRIST.hash_ep_square(self)
+
+        self.zkey_stack.append(self.zkey)
+        super().push(move)
+
+        key ^= self.piece_keys(mask)
+        if castling:
+            key ^= _ZOBRIST.hash_castling(self)
+        if self.ep_square is not None:
+            key ^= _ZOBRIST.hash_ep_square(self)
+        self.zkey = key
+
+    def pop(self):
+        move = super().pop()
+        # Moves made before the board was wrapped have no saved key
+        self.zkey = self.zkey_stack.pop() if self.zkey_stack else chess.polyglot.zobrist_hash(self)
+        return move
+
+
+class TranspositionTable:
+    """Fixed-size table of search results that can be shared between engines
+    and kept across moves. Slot = hash & mask, holding
+    (hash, score, depth, flag, best_move, generation) tuples."""
+
+    def __init__(self, size=TT_SIZE):
+        """Initialize with the number of slots (a power of two)"""
+        self.mask = size - 1
+        self.slots = [None] * size
+        # Bumped by the owner whenever the game moves on, so entries from
+        # earlier positions give way to fresh ones
+        self.generation = 0
+
+    def probe(self, board_hash):
+        """Return the entry stored for `board_hash`, or None"""
+        entry = self.slots[board_hash & self.mask]
+        if entry is not None and entry[0] == board_hash:
+            return entry
+        return None
+
+    def store(self, board_hash, score, depth, flag, best_move):
+        """Store a result, unless the slot holds a deeper one from this generation"""
+        index = board_hash & self.mask
+        entry = self.slots[index]
+        if entry is not None and entry[2] > depth and entry[5] == self.generation:
+            return
+        self.slots[index] = (board_hash, score, depth, flag, best_move, self.generation)
+
+    def clear(self):
+        """Drop every entry"""
+        self.slots = [None] * (self.mask + 1)
+
+
+class SearchCancelled(Exception):
+    """Raised out of a search once its stop flag has been set"""
+
 
 class ChessAI:
     def __init__(self, evaluator=None):
         #Initialize the ChessAI with an evaluator
         self.evaluator = evaluator
         self.nodes_evaluated = 0
+        # threading.Event the caller can set to abandon the running search
+        self.stop_flag = None
+
+    def __getstate__(self):
+        # Events can't be pickled; root-search worker processes don't need it
+        state = self.__dict__.copy()
+        state["stop_flag"] = None
+        return state
 
     def get_best_move(self, board):
         #Get the best move for the current position
@@ -34,10 +281,15 @@ class GreedyAI(ChessAI):
     def get_best_move(self, board):
         #Return the move with the best immediate evaluation
         self.reset_stats()
+        moves = list(board.legal_moves)
+        if len(moves) <= 1:
+            # Nothing to choose between
+            return moves[0] if moves else None
+
         best_move = None
-        best_eval = float('-inf') if board.turn == chess.WHITE else float('inf')
+        best_eval = -INF if board.turn == chess.WHITE else INF
 
-        for move in board.legal_moves:
+        for move in moves:
             board.push(move)
             self.nodes_evaluated += 1
 
@@ -59,281 +311,220 @@ class GreedyAI(ChessAI):
         return best_move
 
 
-class MinimaxAI(ChessAI):
-    #AI that uses the minimax algorithm
+class SearchAI(ChessAI):
+    """Base class for the depth-limited searches, written in negamax form"""
 
-    def __init__(self, evaluator, depth=3):
-        #Initialize with evaluator again and the wanted search depth
+    # Whether sibling moves may be cut off once alpha >= beta
+    use_pruning = True
+
+    def __init__(self, evaluator, depth=3, workers=1):
+        """Initialize with evaluator, search depth and number of root worker processes"""
         super().__init__(evaluator)
         self.depth = depth
+        self.workers = workers
 
     def get_best_move(self, board):
-        #Return the best move according to minimax
+        """Return the best move for the side to move"""
         self.reset_stats()
-        best_move = None
-        best_eval = float('-inf') if board.turn == chess.WHITE else float('inf')
-
-        for move in board.legal_moves:
-            board.push(move)
-
-            # Evaluate this move using minimax
-            if board.turn == chess.WHITE:  # We just made a move for black
-                eval_score = self.minimax(board, self.depth - 1, False)
-                if eval_score < best_eval:
-                    best_eval = eval_score
-                    best_move = move
-            else:  # move made for white
-                eval_score = self.minimax(board, self.depth - 1, True)
-                if eval_score > best_eval:
-                    best_eval = eval_score
-                    best_move = move
-
-            board.pop()
-
-        return best_move
-
-    def minimax(self, board, depth, maximizing_player):
-        #Minimax algorithm implementation
-        self.nodes_evaluated += 1
-
-        # the base case leaf node or terminal position
-        if depth == 0 or board.is_game_over():
-            return self.evaluator.evaluate(board)
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.minimax(board, depth - 1, False)
-                board.pop()
-                max_eval = max(max_eval, eval_score)
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.minimax(board, depth - 1, True)
-                board.pop()
-                min_eval = min(min_eval, eval_score)
-            return min_eval
-
+        moves = list(board.legal_moves)
+        if len(moves) <= 1:
+            # Forced (or no) move, no need to search
+            return moves[0] if moves else None
+        return self.search_root(board, self.depth)
 
-class AlphaBetaAI(ChessAI):
-    """AI that uses the minimax algorithm with alpha-beta pruning"""
+    def search_root(self, board, depth, pv_move=None):
+        """Search every root move to `depth`, trying `pv_move` first if given"""
+        moves = list(board.legal_moves)
+        if pv_move in moves:
+            moves.remove(pv_move)
+            moves.insert(0, pv_move)
 
-    def __init__(self, evaluator, depth=3):
-        """Initialize with evaluator and search depth"""
-        super().__init__(evaluator)
-        self.depth = depth
+        if self.workers > 1 and len(moves) > 1:
+            return self.search_root_parallel(board, depth, moves)
+        return self.search_root_serial(board, depth, moves)
 
-    def get_best_move(self, board):
-        """Return the best move according to alpha-beta pruning"""
-        self.reset_stats()
+    def search_root_serial(self, board, depth, moves):
+        """Search `moves` in order in this process; returns the best one"""
         best_move = None
-        alpha = float('-inf')
-        beta = float('inf')
+        best_eval = -INF
+        alpha = -INF
+        beta = INF
 
-        if board.turn == chess.WHITE:
-            best_eval = float('-inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, self.depth - 1, alpha, beta, False)
-                board.pop()
+        for move in moves:
+            board.push(move)
+            eval_score = -self.negamax(board, depth - 1, -beta, -alpha, 1)
+            board.pop()
 
-                if eval_score > best_eval:
-                    best_eval = eval_score
-                    best_move = move
+            if eval_score > best_eval:
+                best_eval = eval_score
+                best_move = move
+            if eval_score > alpha:
+                alpha = eval_score
 
-                alpha = max(alpha, best_eval)
-        else:
-            best_eval = float('inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, self.depth - 1, alpha, beta, True)
-                board.pop()
+        return best_move
 
-                if eval_score < best_eval:
+    def search_root_parallel(self, board, depth, moves):
+        """Root split, young brothers wait: the first move is searched here for
+        a bound, then the rest in waves of one move per worker process. Every
+        wave is searched against the best score so far, so only moves that
+        can beat it are resolved exactly, much as in the serial search."""
+        board.push(moves[0])
+        best_eval = -self.negamax(board, depth - 1, -INF, INF, 1)
+        board.pop()
+        best_move = moves[0]
+
+        # Engine and board are pickled once for the whole search; only the
+        # part of the move stack that repetition checks can use is shipped
+        payload = pickle.dumps((self, board.copy(stack=board.halfmove_clock)))
+        search_id = next(_ROOT_SEARCH_IDS)
+        pool, live_search = _get_root_pool(self.workers)
+        # Any root moves of an earlier, abandoned search stop at their next node
+        live_search.value = search_id
+
+        for i in range(1, len(moves), self.workers):
+            wave = moves[i:i + self.workers]
+            futures = [pool.submit(_search_root_move, search_id, payload, move, depth, best_eval)
+                       for move in wave]
+
+            # Wait in short slices so a stop request is answered promptly; the
+            # moves already running see the live id change and stop too
+            pending = set(futures)
+            while pending:
+                if self.stop_flag is not None and self.stop_flag.is_set():
+                    live_search.value = -1
+                    for future in futures:
+                        future.cancel()
+                    raise SearchCancelled()
+                _, pending = wait(pending, timeout=_ROOT_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+            # Ties keep the earlier move, as in the serial search
+            for move, future in zip(wave, futures):
+                eval_score, nodes = future.result()
+                self.nodes_evaluated += nodes
+                if eval_score > best_eval:
                     best_eval = eval_score
                     best_move = move
 
-                beta = min(beta, best_eval)
-
         return best_move
 
-    def alpha_beta(self, board, depth, alpha, beta, maximizing_player):
-        """Alpha-beta pruning algorithm implementation"""
+    def negamax(self, board, depth, alpha, beta, ply):
+        """Fail-soft negamax; scores are from the side to move's point of view"""
         self.nodes_evaluated += 1
+        if self.stop_flag is not None and self.stop_flag.is_set():
+            raise SearchCancelled()
 
         # Base case: leaf node or terminal position
-        if depth == 0 or board.is_game_over():
-            return self.evaluator.evaluate(board)
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, False)
-                board.pop()
-                max_eval = max(max_eval, eval_score)
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break  # Beta cutoff
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, True)
-                board.pop()
-                min_eval = min(min_eval, eval_score)
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break  # Alpha cutoff
-            return min_eval
-
-
-class NegamaxAI(ChessAI):
-    """AI that uses the negamax algorithm (a variant of minimax)"""
-
-    def __init__(self, evaluator, depth=3):
-        """Initialize with evaluator and search depth"""
-        super().__init__(evaluator)
-        self.depth = depth
-
-    def get_best_move(self, board):
-        """Return the best move according to negamax"""
-        self.reset_stats()
-        best_move = None
-        best_eval = float('-inf')
+        if depth == 0:
+            return self.evaluate_leaf(board, alpha, beta)
+        moves = list(board.legal_moves)
+        if self.is_terminal(board, moves):
+            return self.evaluate_for_side(board)
 
-        for move in board.legal_moves:
+        best_eval = -INF
+        for move in moves:
             board.push(move)
-            eval_score = -self.negamax(board, self.depth - 1)
+            eval_score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
             board.pop()
 
             if eval_score > best_eval:
                 best_eval = eval_score
-                best_move = move
+            if eval_score > alpha:
+                alpha = eval_score
+            if self.use_pruning and alpha >= beta:
+                break  # Cutoff
+
+        return best_eval
+
+    def is_terminal(self, board, moves):
+        """Game-over test that reuses an already generated legal move list"""
+        return (not moves or board.is_insufficient_material()
+                or board.is_seventyfive_moves() or board.is_fivefold_repetition())
+
+    def evaluate_leaf(self, board, alpha, beta):
+        """Score a node at the search horizon"""
+        # Without pruning every leaf score is used as-is, so keep it exact
+        if not self.use_pruning:
+            return self.evaluate_for_side(board)
+        return self.evaluate_for_side(board, alpha, beta)
 
-        return best_move
+    def evaluate_for_side(self, board, alpha=-INF, beta=INF):
+        """Evaluate the position from the perspective of the side to move.
+        Outside (alpha, beta) the evaluator may stop early with a fail-soft bound."""
+        if board.turn == chess.WHITE:
+            eval_score, _ = self.evaluator.evaluate_within(board, alpha, beta)
+            return int(eval_score)
+        # The evaluator scores from white's side, so flip the window
+        eval_score, _ = self.evaluator.evaluate_within(board, -beta, -alpha)
+        return -int(eval_score)
 
-    def negamax(self, board, depth):
-        """Negamax algorithm implementation"""
+    def quiescence(self, board, alpha, beta, depth):
+        """Quiescence search to handle the horizon effect"""
         self.nodes_evaluated += 1
 
-        # Base case: leaf node or terminal position
+        # Base evaluation
+        stand_pat = self.evaluate_for_side(board, alpha, beta)
+
+        # Return immediately if maximum depth reached or game over
         if depth == 0 or board.is_game_over():
-            return self.evaluate_for_side(board)
+            return stand_pat
 
-        max_eval = float('-inf')
-        for move in board.legal_moves:
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        best_eval = stand_pat
+        # Only consider captures for quiescence
+        for move in self.get_capture_moves(board):
             board.push(move)
-            eval_score = -self.negamax(board, depth - 1)
+            eval_score = -self.quiescence(board, -beta, -alpha, depth - 1)
             board.pop()
-            max_eval = max(max_eval, eval_score)
 
-        return max_eval
+            if eval_score > best_eval:
+                best_eval = eval_score
+            if eval_score > alpha:
+                alpha = eval_score
+            if alpha >= beta:
+                break
 
-    def evaluate_for_side(self, board):
-        """Evaluate the position from the perspective of the side to move"""
-        eval_score = self.evaluator.evaluate(board)
-        return eval_score if board.turn == chess.WHITE else -eval_score
+        return best_eval
 
+    def get_capture_moves(self, board):
+        """Get all capture moves from the current position, MVV-LVA ordered"""
+        captures = list(board.generate_legal_captures())
+        # En passant leaves the target square empty, so default the victim to a pawn
+        captures.sort(
+            key=lambda m: 10 * _PIECE_VALUES[board.piece_type_at(m.to_square) or chess.PAWN]
+            - _PIECE_VALUES[board.piece_type_at(m.from_square)],
+            reverse=True)
+        return captures
 
-class QuiescenceSearchAI(AlphaBetaAI):
-    """AI that uses alpha-beta pruning with quiescence search to handle the horizon effect"""
 
-    def __init__(self, evaluator, depth=3, quiescence_depth=3):
-        """Initialize with evaluator, main search depth, and quiescence depth"""
-        super().__init__(evaluator, depth)
-        self.quiescence_depth = quiescence_depth
+class MinimaxAI(SearchAI):
+    #AI that uses the minimax algorithm (searched in negamax form, no pruning)
+    use_pruning = False
 
-    def alpha_beta(self, board, depth, alpha, beta, maximizing_player):
-        """Alpha-beta pruning with quiescence search"""
-        self.nodes_evaluated += 1
 
-        # If at leaf node, perform quiescence search
-        if depth == 0:
-            return self.quiescence(board, alpha, beta, maximizing_player, self.quiescence_depth)
+class AlphaBetaAI(SearchAI):
+    """AI that uses the minimax algorithm with alpha-beta pruning"""
 
-        # Terminal position
-        if board.is_game_over():
-            return self.evaluator.evaluate(board)
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, False)
-                board.pop()
-                max_eval = max(max_eval, eval_score)
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break  # Beta cutoff
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, True)
-                board.pop()
-                min_eval = min(min_eval, eval_score)
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break  # Alpha cutoff
-            return min_eval
-
-    def quiescence(self, board, alpha, beta, maximizing_player, depth):
-        """Quiescence search to handle the horizon effect"""
-        self.nodes_evaluated += 1
 
-        # Base evaluation
-        stand_pat = self.evaluator.evaluate(board)
+class NegamaxAI(SearchAI):
+    """AI that uses the negamax algorithm (a variant of minimax)"""
+    use_pruning = False
 
-        # Return immediately if maximum depth reached or game over
-        if depth == 0 or board.is_game_over():
-            return stand_pat
 
-        if maximizing_player:
-            max_eval = stand_pat
-            if stand_pat >= beta:
-                return beta
-            alpha = max(alpha, stand_pat)
-
-            # Only consider captures for quiescence
-            for move in self.get_capture_moves(board):
-                board.push(move)
-                eval_score = self.quiescence(board, alpha, beta, False, depth - 1)
-                board.pop()
-                max_eval = max(max_eval, eval_score)
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = stand_pat
-            if stand_pat <= alpha:
-                return alpha
-            beta = min(beta, stand_pat)
-
-            # Only consider captures for quiescence
-            for move in self.get_capture_moves(board):
-                board.push(move)
-                eval_score = self.quiescence(board, alpha, beta, True, depth - 1)
-                board.pop()
-                min_eval = min(min_eval, eval_score)
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break
-            return min_eval
+class QuiescenceSearchAI(AlphaBetaAI):
+    """AI that uses alpha-beta pruning with quiescence search to handle the horizon effect"""
 
-    def get_capture_moves(self, board):
-        """Get all capture moves from the current position"""
-        captures = []
-        for move in board.legal_moves:
-            if board.is_capture(move):
-                captures.append(move)
-        return captures
+    def __init__(self, evaluator, depth=3, quiescence_depth=3, workers=1):
+        """Initialize with evaluator, main search depth, and quiescence depth"""
+        super().__init__(evaluator, depth, workers)
+        self.quiescence_depth = quiescence_depth
+
+    def evaluate_leaf(self, board, alpha, beta):
+        """At the horizon, keep resolving captures before evaluating"""
+        return self.quiescence(board, alpha, beta, self.quiescence_depth)
 
 
 class IterativeDeepeningAI(AlphaBetaAI):
@@ -355,15 +546,16 @@ class IterativeDeepeningAI(AlphaBetaAI):
         legal_moves = list(board.legal_moves)
         if legal_moves:
             best_move = legal_moves[0]
+        if len(legal_moves) <= 1:
+            # Forced (or no) move, no need to search
+            return best_move
 
         # Iterative deepening loop
         while time.time() - start_time < self.time_limit:
             try:
-                # Set the current search depth
-                self.depth = depth
-
-                # Run alpha-beta at the current depth
-                move = super().get_best_move(board)
+                # Run alpha-beta at the current depth, searching the previous
+                # iteration's best move first
+                move = self.search_root(board, depth, best_move)
                 if move:
                     best_move = move
 
@@ -374,6 +566,8 @@ class IterativeDeepeningAI(AlphaBetaAI):
                 if depth > 10:
                     break
 
+            except SearchCancelled:
+                raise
             except Exception as e:
                 print(f"Error in iterative deepening at depth {depth}: {e}")
                 break
@@ -382,7 +576,7 @@ class IterativeDeepeningAI(AlphaBetaAI):
         return best_move
 
 
-class AdvancedModeAI(ChessAI):
+class AdvancedModeAI(SearchAI):
     """
     - Alpha-beta pruning
     - Quiescence search
@@ -392,270 +586,295 @@ class AdvancedModeAI(ChessAI):
     - Iterative deepening
     """
 
-    def __init__(self, evaluator, depth=4):
-        #Initialize with evaluator and search depth
-        super().__init__(evaluator)
-        self.depth = depth
-        self.transposition_table = {}
-        self.killer_moves = [[None for _ in range(20)] for _ in range(2)]  # Store 2 killer moves per depth
+    def __init__(self, evaluator, depth=4, tt=None):
+        #Initialize with evaluator, search depth and an optional shared transposition table
+        super().__init__(evaluator, depth)
+        self.quiescence_depth = 5
+        # Kept across moves; the owner ages it through tt.generation
+        self.tt = tt if tt is not None else TranspositionTable()
+        # Two killer slots per ply, stored flat: [2 * ply] and [2 * ply + 1]
+        self.killer_moves = [None] * (2 * (depth + self.quiescence_depth))
+        # History heuristic, indexed by from_square * 64 + to_square
+        self.history = [0] * (64 * 64)
+        self.path_hashes = []  # Hashes of the game history and the current search line
 
     def get_best_move(self, board):
-        #Iterative-deepened alpha-beta + quiescence + transposition +
-        #killer moves, with correct root‐side comparisons.
+        #Iterative-deepened negamax alpha-beta + quiescence + transposition +
+        #killer moves. Scores are always from the side to move's POV.
 
         self.reset_stats()
-        # clear tables at new root
-        self.transposition_table.clear()
-        self.killer_moves = [[None for _ in range(20)] for _ in range(2)]
+        root_moves = list(board.legal_moves)
+        if len(root_moves) <= 1:
+            # Forced (or no) move, no need to search
+            return root_moves[0] if root_moves else None
 
-        best_move = None
-        root_turn = board.turn  # ← remember who’s to move at the root
+        # killers and history are kept across the iterative-deepening
+        # iterations below, only cleared here between root calls
+        self.clear_move_tables()
+        self.path_hashes = self.get_history_hashes(board)
+        # search on a board that hashes itself incrementally on push/pop
+        board = ZobristBoard.from_board(board)
+
+        best_move = None  # best move of the previous iteration is searched first
+        best_eval = 0
 
         # iterative deepening from 1 to self.depth
         for current_depth in range(1, self.depth + 1):
-            alpha = float('-inf')
-            beta = float('inf')
-            ordered_moves = self.order_moves(board, None, 0)
-
-            # track best eval at this depth based on root_turn
-            if root_turn == chess.WHITE:
-                best_eval = float('-inf')
+            # Aspiration window around the previous iteration's score; the
+            # side that fails is opened to infinity and the depth re-searched
+            if current_depth >= 3:
+                alpha, beta = best_eval - _ASPIRATION_WINDOW, best_eval + _ASPIRATION_WINDOW
             else:
-                best_eval = float('inf')
-
-            for move in ordered_moves:
-                board.push(move)
-                # now call alpha_beta exactly as before
-                eval_score = self.alpha_beta(
-                    board,
-                    current_depth - 1,
-                    alpha,
-                    beta,
-                    maximizing_player=(not root_turn),  # next ply is opposite side
-                    ply=0
-                )
-                board.pop()
-
-                # compare *always* from root_turn’s POV:
-                if root_turn == chess.WHITE:
-                    if eval_score > best_eval:
-                        best_eval, best_move = eval_score, move
-                        alpha = max(alpha, best_eval)
+                alpha, beta = -INF, INF
+
+            while True:
+                eval_score, move = self.search_root_window(
+                    board, root_moves, current_depth, alpha, beta, best_move)
+                if eval_score <= alpha:
+                    alpha = -INF
+                elif eval_score >= beta:
+                    beta = INF
                 else:
-                    if eval_score < best_eval:
-                        best_eval, best_move = eval_score, move
-                        beta = min(beta, best_eval)
+                    break
 
-            # end for each move
+            best_eval, best_move = eval_score, move
         # end iterative‐deepening
 
         return best_move
 
-    def alpha_beta(self, board, depth, alpha, beta, maximizing_player, ply):
-        #Alpha-beta pruning with advanced techniques
+    def search_root_window(self, board, root_moves, depth, alpha, beta, pv_move):
+        """Search the root moves inside (alpha, beta); returns (score, best move)"""
+        best_eval = -INF
+        best_move = None
+        ordered_moves = self.order_moves(board, root_moves, None, 0, pv_move)
+
+        for i, move in enumerate(ordered_moves):
+            board.push(move)
+            if i == 0:
+                eval_score = -self.alpha_beta(board, depth - 1, -beta, -alpha, ply=0)
+            else:
+                # PVS: null-window probe, full re-search only if it beats alpha
+                eval_score = -self.alpha_beta(board, depth - 1, -alpha - 1, -alpha, ply=0)
+                if alpha < eval_score < beta:
+                    eval_score = -self.alpha_beta(board, depth - 1, -beta, -alpha, ply=0)
+            board.pop()
+
+            if eval_score > best_eval:
+                best_eval, best_move = eval_score, move
+                alpha = max(alpha, best_eval)
+                if alpha >= beta:
+                    break  # Fail high, the caller widens the window
+
+        return best_eval, best_move
+
+    def alpha_beta(self, board, depth, alpha, beta, ply):
+        #Negamax alpha-beta pruning with advanced techniques
         self.nodes_evaluated += 1
+        if self.stop_flag is not None and self.stop_flag.is_set():
+            raise SearchCancelled()
 
-        # Check for repetition or fifty-move rule
-        if board.is_repetition(2) or board.is_fifty_moves():
-            return 0.0  # Draw
+        board_hash = self.get_board_hash(board)
+
+        # Check for repetition (position already seen on this line) or fifty-move rule
+        if board_hash in self.path_hashes or board.is_fifty_moves():
+            return 0  # Draw
 
         # Check transposition table
-        board_hash = self.get_board_hash(board)
-        if board_hash in self.transposition_table and self.transposition_table[board_hash]['depth'] >= depth:
-            return self.transposition_table[board_hash]['score']
+        # Only EXACT scores can be returned as-is, bounds just narrow the window
+        alpha_orig, beta_orig = alpha, beta
+        entry = self.tt.probe(board_hash)
+        tt_move = None
+        if entry is not None:
+            _, tt_score, tt_depth, tt_flag, tt_move, _ = entry
+            if tt_score > _MATE_BOUND:
+                tt_score -= ply
+            elif tt_score < -_MATE_BOUND:
+                tt_score += ply
+            if tt_depth >= depth:
+                if tt_flag == TT_EXACT:
+                    return tt_score
+                elif tt_flag == TT_LOWER:
+                    alpha = max(alpha, tt_score)
+                elif tt_flag == TT_UPPER:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
 
         # If at leaf node, perform quiescence search
         if depth == 0:
-            return self.quiescence(board, alpha, beta, maximizing_player, 5)
+            return self.quiescence(board, alpha, beta, self.quiescence_depth)
         # Terminal position
-        if board.is_game_over():
-            if board.is_checkmate():
+        moves = list(board.legal_moves)
+        if self.is_terminal(board, moves):
+            if not moves and board.is_check():
                 # Return a score based on how quickly checkmate was found
-                return -10000 + ply if maximizing_player else 10000 - ply
-            return 0.0  # Draw
+                return -MATE_SCORE + ply
+            return 0  # Draw
+
+        # Null-move pruning: give the opponent a free move; if a reduced search
+        # still fails high, a real move would too. Skipped when in check, right
+        # after another null move, and when the side to move has only pawns
+        # left, where zugzwang makes passing unsound.
+        in_check = board.is_check()
+        if (depth >= 3 and not in_check
+                and board.occupied_co[board.turn] & ~board.kings & ~board.pawns
+                and (not board.move_stack or board.peek())):
+            board.push(chess.Move.null())
+            null_score = -self.alpha_beta(board, depth - 1 - _NULL_MOVE_R, -beta, -beta + 1, ply + 1)
+            board.pop()
+            if null_score >= beta:
+                # A mate found after passing is not a proven mate
+                return beta if null_score > _MATE_BOUND else null_score
 
         # Get ordered moves
-        ordered_moves = self.order_moves(board, self.killer_moves[0][ply], ply)
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in ordered_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, False, ply + 1)
-                board.pop()
-
-                if eval_score > max_eval:
-                    max_eval = eval_score
-
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    # Store killer move
-                    if not board.is_capture(move):
-                        self.killer_moves[1][ply] = self.killer_moves[0][ply]
-                        self.killer_moves[0][ply] = move
-                    break  # Beta cutoff
-
-            # Store in transposition table
-            self.transposition_table[board_hash] = {'score': max_eval, 'depth': depth}
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in ordered_moves:
-                board.push(move)
-                eval_score = self.alpha_beta(board, depth - 1, alpha, beta, True, ply + 1)
-                board.pop()
-
-                if eval_score < min_eval:
-                    min_eval = eval_score
-
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    # Store killer move
-                    if not board.is_capture(move):
-                        self.killer_moves[1][ply] = self.killer_moves[0][ply]
-                        self.killer_moves[0][ply] = move
-                    break  # Alpha cutoff
-
-            # Store in transposition table
-            self.transposition_table[board_hash] = {'score': min_eval, 'depth': depth}
-            return min_eval
-
-    def quiescence(self, board, alpha, beta, maximizing_player, depth):
-        #Quiescence search to handle the horizon effect
-        self.nodes_evaluated += 1
-
-        # Base evaluation
-        stand_pat = self.evaluator.evaluate(board)
+        ordered_moves = self.order_moves(board, moves, self.killer_moves[2 * ply], ply, tt_move)
 
-        # Return immediately if maximum depth reached or game over
-        if depth == 0 or board.is_game_over():
-            return stand_pat
+        best_move = None
+        best_eval = -INF
+        self.path_hashes.append(board_hash)
+        for i, move in enumerate(ordered_moves):
+            # Late move reductions apply to quiet moves far down the ordering
+            late_quiet = (i >= 4 and depth >= 3 and not in_check
+                          and not move.promotion and not board.is_capture(move))
+            board.push(move)
+            if i == 0:
+                eval_score = -self.alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                eval_score = None
+                if late_quiet and not board.is_check():
+                    reduction = 1 + int(math.log(depth) * math.log(i) / 2)
+                    reduced_depth = max(0, depth - 1 - reduction)
+                    eval_score = -self.alpha_beta(board, reduced_depth, -alpha - 1, -alpha, ply + 1)
+
+                # Principal variation search: the first move is assumed best,
+                # the rest only have to be proven worse with a null window.
+                # A reduced move that beat alpha is verified at full depth.
+                if eval_score is None or eval_score > alpha:
+                    eval_score = -self.alpha_beta(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                    if alpha < eval_score < beta:
+                        eval_score = -self.alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
 
-        if maximizing_player:
-            max_eval = stand_pat
-            if stand_pat >= beta:
-                return beta
-            alpha = max(alpha, stand_pat)
-
-            # Only consider captures for quiescence
-            for move in self.get_capture_moves(board):
-                board.push(move)
-                eval_score = self.quiescence(board, alpha, beta, False, depth - 1)
-                board.pop()
-                max_eval = max(max_eval, eval_score)
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break
-            return max_eval
+            if eval_score > best_eval:
+                best_eval, best_move = eval_score, move
+
+            alpha = max(alpha, eval_score)
+            if alpha >= beta:
+                # Store killer move and reward the quiet move in the history table
+                if not board.is_capture(move):
+                    if self.killer_moves[2 * ply] != move:
+                        self.killer_moves[2 * ply + 1] = self.killer_moves[2 * ply]
+                        self.killer_moves[2 * ply] = move
+                    self.history[move.from_square * 64 + move.to_square] += depth * depth
+                break  # Cutoff
+        self.path_hashes.pop()
+
+        self.store_tt(board_hash, best_eval, depth, alpha_orig, beta_orig, best_move, ply)
+        return best_eval
+
+    def clear_move_tables(self):
+        """Reset the killer and history tables in place"""
+        killer_moves = self.killer_moves
+        for i in range(len(killer_moves)):
+            killer_moves[i] = None
+        history = self.history
+        for i in range(len(history)):
+            history[i] = 0
+
+    def store_tt(self, board_hash, score, depth, alpha_orig, beta_orig, best_move, ply):
+        """Store a search result, classifying it against the original window"""
+        if score <= alpha_orig:
+            flag = TT_UPPER
+        elif score >= beta_orig:
+            flag = TT_LOWER
         else:
-            min_eval = stand_pat
-            if stand_pat <= alpha:
-                return alpha
-            beta = min(beta, stand_pat)
-
-            # Only consider captures for quiescence
-            for move in self.get_capture_moves(board):
-                board.push(move)
-                eval_score = self.quiescence(board, alpha, beta, True, depth - 1)
-                board.pop()
-                min_eval = min(min_eval, eval_score)
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break
-            return min_eval
-
-    def get_capture_moves(self, board):
-        #Get all capture moves from the current position
-        captures = []
-        for move in board.legal_moves:
-            if board.is_capture(move):
-                captures.append(move)
-        return captures
-
-    def order_moves(self, board, killer_move, ply):
-        """Order moves for more efficient pruning, with endgame-aware promotion weighting."""
-        # 0) Compute an endgame multiplier based on how few non-pawn pieces remain
-        non_king_non_pawn = 0
-        for sq in chess.SQUARES:
-            piece = board.piece_at(sq)
-            if piece and piece.piece_type not in (chess.KING, chess.PAWN):
-                non_king_non_pawn += 1
-        # As pieces drop off, multiplier goes from 1.0 up to ~2.0
-        endgame_factor = max(0.0, (10 - non_king_non_pawn) / 10.0)
-        multiplier = 1.0 + endgame_factor
-
-        moves = list(board.legal_moves)
-        scored_moves = []
+            flag = TT_EXACT
+        # Mate scores are counted from this node, not from the root
+        if score > _MATE_BOUND:
+            score += ply
+        elif score < -_MATE_BOUND:
+            score -= ply
+        self.tt.store(board_hash, score, depth, flag, best_move)
+
+    def order_moves(self, board, moves, killer_move, ply, tt_move=None):
+        """Lazily order moves for more efficient pruning, with endgame-aware promotion weighting."""
+        # 0) Endgame-weighted bonuses, looked up by how few non-pawn pieces remain
+        non_king_non_pawn = chess.popcount(board.occupied & ~board.kings & ~board.pawns)
+        promo_score, push_score = _PHASE_BONUSES[non_king_non_pawn]
+
+        # Per-node constants, hoisted so the per-move loop only does
+        # integer and bitboard arithmetic
+        opponent = not board.turn
+        enemy = board.occupied_co[opponent]
+        own_pawns = board.pawns & board.occupied_co[board.turn]
+        push_rank = chess.BB_RANK_7 if board.turn == chess.WHITE else chess.BB_RANK_2
+        bb_squares = chess.BB_SQUARES
+        piece_type_at = board.piece_type_at
+        history = self.history
+
+        # Scores kept parallel to `moves` (no per-move tuples)
+        scores = []
 
         for move in moves:
             score = 0
+            from_sq = move.from_square
+            to_sq = move.to_square
+            to_bb = bb_squares[to_sq]
+
+            # 1) MVV-LVA: prioritize captures (en passant lands on an empty square),
+            #    quiet moves fall back on the history heuristic, capped so it
+            #    never outranks killers or sound captures
+            if to_bb & enemy:
+                score = 10 * _PIECE_VALUES[piece_type_at(to_sq)] - _PIECE_VALUES[piece_type_at(from_sq)]
+            else:
+                score = min(history[from_sq * 64 + to_sq], _HISTORY_CAP)
 
-            # 1) MVV-LVA: prioritize captures
-            if board.is_capture(move):
-                victim = board.piece_at(move.to_square)
-                aggressor = board.piece_at(move.from_square)
-                if victim and aggressor:
-                    v_val = self.get_piece_value(victim.piece_type)
-                    a_val = self.get_piece_value(aggressor.piece_type)
-                    score = 10 * v_val - a_val
-
-            # 2) Promotions: boosted by multiplier, but penalize unsafe ones
+            # 2) Promotions: boosted by multiplier, but penalize unsafe ones.
+            #    The attack mask is taken before the move, so a slider hidden
+            #    behind the promoting pawn is missed; good enough for ordering.
             if move.promotion:
-                base_promo = 1200
-                promo_score = int(base_promo * multiplier)
                 score += promo_score
-                board.push(move)
-                if board.is_attacked_by(not board.turn, move.to_square):
+                if board.attackers_mask(opponent, to_sq):
                     score -= 300
-                board.pop()
-
-            # 3) Pawn pushes one step from queening: also boosted in endgame
-            piece = board.piece_at(move.from_square)
-            if piece and piece.piece_type == chess.PAWN:
-                target_rank = chess.square_rank(move.to_square)
-                if (piece.color == chess.WHITE and target_rank == 6) or \
-                        (piece.color == chess.BLACK and target_rank == 1):
-                    base_push = 200
-                    push_score = int(base_push * multiplier)
+
+            if own_pawns & bb_squares[from_sq]:
+                # 3) Pawn pushes one step from queening: also boosted in endgame
+                if to_bb & push_rank:
                     score += push_score
+                # 4) Pawn center-control (opening bonus)
+                if to_bb & _CENTER_SQUARES:
+                    score += 10
 
-            # 4) Delivering checks
-            board.push(move)
-            if board.is_check():
+            # 5) Delivering checks
+            if board.gives_check(move):
                 score += 50
-            board.pop()
 
-            # 5) Killer-move heuristic
+            # 6) Killer-move heuristic
             if killer_move and move == killer_move:
                 score += 30
 
-            # 6) Pawn center-control (opening bonus)
-            if board.piece_at(move.from_square) and board.piece_at(move.from_square).piece_type == chess.PAWN:
-                if move.to_square in [27, 28, 35, 36]:  # e4, d4, e5, d5
-                    score += 10
+            # 7) Best move stored in the transposition table goes first
+            if tt_move and move == tt_move:
+                score += 100000
 
-            scored_moves.append((move, score))
+            scores.append(score)
 
-        # Sort descending by score and return moves
-        scored_moves.sort(key=lambda x: x[1], reverse=True)
-        return [move for move, _ in scored_moves]
+        return _iter_ordered(moves, scores)
 
     def get_piece_value(self, piece_type):
         """Get the value of a piece type"""
-        if piece_type == chess.PAWN:
-            return 1
-        elif piece_type == chess.KNIGHT:
-            return 3
-        elif piece_type == chess.BISHOP:
-            return 3
-        elif piece_type == chess.ROOK:
-            return 5
-        elif piece_type == chess.QUEEN:
-            return 9
-        elif piece_type == chess.KING:
-            return 100
-        return 0
+        return _PIECE_VALUES[piece_type]
+
+    def get_history_hashes(self, board):
+        """Hashes of every position played so far, including the current one"""
+        # Nothing before the last capture or pawn move can repeat
+        history = board.copy(stack=board.halfmove_clock)
+        hashes = [chess.polyglot.zobrist_hash(history)]
+        while history.move_stack:
+            history.pop()
+            hashes.append(chess.polyglot.zobrist_hash(history))
+        return hashes
 
     def get_board_hash(self, board):
-        """Get a hash of the current board position"""
-        return board.fen()
+        """Get the 64-bit Zobrist hash of the current position, kept incrementally by ZobristBoard"""
+        return board.zkey
@@ -1,21 +1,44 @@
 
 
 import chess
+import os
+import queue
 import time
 import threading
+import weakref
+from collections import deque
 
 import pygame
 
-from chess_gui import ChessGUI
+from chess_gui import ChessGUI, AI_MOVE_READY
 from chess_ai import (
     RandomAI, GreedyAI, MinimaxAI, AlphaBetaAI,
-    NegamaxAI, QuiescenceSearchAI, IterativeDeepeningAI, AdvancedModeAI
+    NegamaxAI, QuiescenceSearchAI, IterativeDeepeningAI, AdvancedModeAI,
+    TranspositionTable, SearchCancelled
 )
 from evaluation import (
     MaterialEvaluator, PositionalEvaluator, 
-    MobilityEvaluator, KingSafetyEvaluator, CompositeEvaluator
+    MobilityEvaluator, KingSafetyEvaluator, CompositeEvaluator, CachedEvaluator
 )
 
+# Positions whose analysis tab breakdown is remembered (see analysis_evaluators)
+ANALYSIS_CACHE_SIZE = 4096
+
+# Engines whose strength is a search depth, rebuilt by set_ai_depth
+_DEPTH_FACTORIES = {
+    MinimaxAI: lambda game, depth: MinimaxAI(game.evaluator, depth),
+    AlphaBetaAI: lambda game, depth: AlphaBetaAI(game.evaluator, depth),
+    NegamaxAI: lambda game, depth: NegamaxAI(game.evaluator, depth),
+    QuiescenceSearchAI: lambda game, depth: QuiescenceSearchAI(game.evaluator, depth, 3),
+    AdvancedModeAI: lambda game, depth: AdvancedModeAI(game.evaluator, depth, game.tt),
+}
+
+# In AI vs AI, moves coming faster than this (seconds) are played silently
+SOUND_MIN_INTERVAL = 0.2
+
+# Every N-th position's evaluation is kept for the graph
+EVAL_SAMPLE_STRIDE = 4
+
 class ChessGame:
 
 
@@ -24,6 +47,11 @@ class ChessGame:
 
         # this is to initiate the board variable with all the legal moves for pieces
         self.board = chess.Board()
+        # Legal moves of the current position, rebuilt lazily after push/pop
+        self._legal_cache = None
+        # Result of check_game_state for the current position, wrapped in a
+        # 1-tuple once known (the result itself may be None)
+        self._game_state = None
 
 
         self.material_evaluator = MaterialEvaluator()
@@ -31,39 +59,82 @@ class ChessGame:
         self.mobility_evaluator = MobilityEvaluator()
         self.king_safety_evaluator = KingSafetyEvaluator()
 
-        # Create  evaluator with weights
-        self.evaluator = CompositeEvaluator([
+        # Create  evaluator with weights, behind a per-position score cache
+        composite = CompositeEvaluator([
             (self.material_evaluator, 1.0),
             (self.positional_evaluator, 0.3),
             (self.mobility_evaluator, 0.2),
             (self.king_safety_evaluator, 0.5)
         ])
-
-        # Initialize the AI algorithms
+        self.eval_weights = dict(composite.evaluator_weights)
+        self.evaluator = CachedEvaluator(composite)
+        # The per-term breakdown shown in the analysis tab, each behind its
+        # own bounded cache so stepping back over earlier positions is free
+        self.analysis_evaluators = [
+            (label, CachedEvaluator(evaluator, ANALYSIS_CACHE_SIZE))
+            for label, evaluator in (
+                ("Material", self.material_evaluator),
+                ("Position", self.positional_evaluator),
+                ("Mobility", self.mobility_evaluator),
+                ("King Safety", self.king_safety_evaluator),
+            )
+        ]
+
+        # AI algorithms by name, as factories: an engine is only built the
+        # first time it is picked (see _get_ai). The depth-4 searches split
+        # their root moves across one worker process per CPU
+        root_workers = os.cpu_count() or 1
+        # One transposition table shared by the engines that use one, kept
+        # across moves and engine/depth switches; aged in make_move
+        self.tt = TranspositionTable()
         self.ai_algorithms = {
-            "Random": RandomAI(),
-            "Greedy": GreedyAI(self.evaluator),
-            "Minimax (Depth 2)": MinimaxAI(self.evaluator, 2),
-            "Minimax (Depth 3)": MinimaxAI(self.evaluator, 3),
-            "Alpha-Beta (Depth 3)": AlphaBetaAI(self.evaluator, 3),
-            "Alpha-Beta (Depth 4)": AlphaBetaAI(self.evaluator, 4),
-            "Negamax (Depth 3)": NegamaxAI(self.evaluator, 3),
-            "Negamax (Depth 4)": NegamaxAI(self.evaluator, 4),
-            "Quiescence (Depth 3)": QuiescenceSearchAI(self.evaluator, 3, 5),
-            "Iterative Deepening (2s)": IterativeDeepeningAI(self.evaluator, 2.0),
-            "Advanced Mode AI (4)": AdvancedModeAI(self.evaluator, 4),
-            "Advanced Mode AI (5)": AdvancedModeAI(self.evaluator, 5),
-            "Advanced Mode AI (6)": AdvancedModeAI(self.evaluator, 6)
+            "Random": lambda: RandomAI(),
+            "Greedy": lambda: GreedyAI(self.evaluator),
+            "Minimax (Depth 2)": lambda: MinimaxAI(self.evaluator, 2),
+            "Minimax (Depth 3)": lambda: MinimaxAI(self.evaluator, 3),
+            "Alpha-Beta (Depth 3)": lambda: AlphaBetaAI(self.evaluator, 3),
+            "Alpha-Beta (Depth 4)": lambda: AlphaBetaAI(self.evaluator, 4, root_workers),
+            "Negamax (Depth 3)": lambda: NegamaxAI(self.evaluator, 3),
+            "Negamax (Depth 4)": lambda: NegamaxAI(self.evaluator, 4, root_workers),
+            "Quiescence (Depth 3)": lambda: QuiescenceSearchAI(self.evaluator, 3, 5),
+            "Iterative Deepening (2s)": lambda: IterativeDeepeningAI(self.evaluator, 2.0),
+            "Advanced Mode AI (4)": lambda: AdvancedModeAI(self.evaluator, 4, self.tt),
+            "Advanced Mode AI (5)": lambda: AdvancedModeAI(self.evaluator, 5, self.tt),
+            "Advanced Mode AI (6)": lambda: AdvancedModeAI(self.evaluator, 6, self.tt)
         }
-        self.current_ai = self.ai_algorithms["Alpha-Beta (Depth 3)"]
-        self.second_ai = self.ai_algorithms["Alpha-Beta (Depth 3)"]
+        self._ai_cache = {}
+        # Reverse of _ai_cache: engine -> name
+        self._ai_names = {}
+        # The hint engine searches on the main thread, so it is never one the
+        # AI worker may be using (see _hint_ai); built on the first hint
+        self.hint_ai = None
+        self.current_ai = self._get_ai("Alpha-Beta (Depth 3)")
+        self.second_ai = self._get_ai("Alpha-Beta (Depth 3)")
+
+        # Backing events of the ai_thinking / ai_vs_ai_running flags, which
+        # both the GUI and the AI worker look at
+        self._thinking_evt = threading.Event()
+        self._ai_vs_ai_evt = threading.Event()
 
         # Game state
         self.player_color = chess.WHITE
         self.ai_thinking = False
         self.game_over = False
         self.move_history = []
-        self.position_evaluations = []
+        # Set when a move was recorded without its SAN (move list hidden)
+        self.missing_sans = False
+        # Evaluation after each ply (most recent 1024) and the strided samples
+        # the graph draws, so its cost does not grow with the game
+        self.position_evaluations = deque(maxlen=1024)
+        self.eval_samples = deque(maxlen=256)
+        # Points handed to the graph, rebuilt only after the evaluations change
+        self.graph_cache = None
+        # Evaluation shown in the graph, updated per move from the material
+        # and piece-square terms only and resynced by force_full_eval() at
+        # set points (see make_move); its value before each move is kept so
+        # undo restores it exactly, resyncs included
+        self.running_eval = self.evaluator.evaluate(self.board)
+        self.evals_before = []
         self.ai_vs_ai_mode = False
         self.ai_vs_ai_running = False
         self.ai_vs_ai_delay = 0.1
@@ -74,7 +145,23 @@ class ChessGame:
         self.black_ai_depth = 3
         self.show_thinking = False
         self.engines = {chess.WHITE: None, chess.BLACK: None}
-        self.ai_vs_ai_thread = None
+        # Engine to move and its class name, indexed by turn (see
+        # _refresh_turn_engines)
+        self._turn_to_engine = [None, None]
+        self._turn_to_engine_name = [None, None]
+        self._refresh_turn_engines()
+
+        # One long-lived worker runs every engine search, fed (engine, moves, delay)
+        # jobs; results come back to the main thread as AI_MOVE_READY events
+        self._ai_jobs = queue.SimpleQueue()
+        # Stop flag of the most recently queued search (see cancel_ai_search)
+        self.ai_stop = threading.Event()
+        # Each engine's own board, only touched by the worker and kept in step
+        # with the game by replaying the moves played since its last search.
+        # Held weakly: an engine replaced by a depth change takes its board
+        # with it
+        self.scratch_boards = weakref.WeakKeyDictionary()
+        threading.Thread(target=self._ai_worker, daemon=True).start()
 
         # Time tracking so that game doesn't start until a move is played
 
@@ -89,9 +176,32 @@ class ChessGame:
 
 
 
+    @property
+    def ai_thinking(self):
+        return self._thinking_evt.is_set()
+
+    @ai_thinking.setter
+    def ai_thinking(self, value):
+        if value:
+            self._thinking_evt.set()
+        else:
+            self._thinking_evt.clear()
+
+    @property
+    def ai_vs_ai_running(self):
+        return self._ai_vs_ai_evt.is_set()
+
+    @ai_vs_ai_running.setter
+    def ai_vs_ai_running(self, value):
+        if value:
+            self._ai_vs_ai_evt.set()
+        else:
+            self._ai_vs_ai_evt.clear()
+
     def set_engine_for_colour(self, colour: chess.Color, engine):
 
         self.engines[colour] = engine
+        self._refresh_turn_engines()
 
         both_engines = self.engines[chess.WHITE] and self.engines[chess.BLACK]
 
@@ -100,24 +210,67 @@ class ChessGame:
         elif not both_engines and self.ai_vs_ai_running:
             self.stop_ai_vs_ai()
 
-        # If it's that colour's move right now and we've just switched on an engine
-        if self.board.turn == colour and engine and not self.ai_vs_ai_running:
-            # Flag thinking so the banner shows immediately
-            self.ai_thinking = True
-            # Kick off the AI on a daemon thread
-            threading.Thread(
-                target=self._background_ai_move,
-                args=(engine,),
-                daemon=True
-            ).start()
+        if not self.ai_vs_ai_running and not self.game_over:
+            if self.board.turn == colour:
+                # That colour is to move right now: drop any search for it and
+                # hand the position to the new engine, if there is one
+                self.cancel_ai_search()
+                if engine:
+                    self.schedule_ai_move(engine)
+            elif not self.ai_thinking and self._ai_for_turn() is not None:
+                # Stopping AI vs AI cancelled the other side's search; restart it
+                self.schedule_ai_move(self._ai_for_turn())
+
+    def _get_ai(self, name):
+        # The engine registered under `name`, built on first use
+        ai = self._ai_cache.get(name)
+        if ai is None:
+            ai = self._ai_cache[name] = self.ai_algorithms[name]()
+            self._ai_names[ai] = name
+        return ai
+
+    def _hint_ai(self):
+        # Advanced Mode AI (4) for hints, kept out of _ai_cache so no worker
+        # job ever searches with it; it shares the transposition table
+        if self.hint_ai is None:
+            self.hint_ai = AdvancedModeAI(self.evaluator, 4, self.tt)
+        return self.hint_ai
+
+    def _legal_set(self):
+        # Legal moves of the current position as a frozenset, generated once per position
+        if self._legal_cache is None:
+            self._legal_cache = frozenset(self.board.generate_legal_moves())
+        return self._legal_cache
+
+    def _do_push(self, move):
+        self.board.push(move)
+        self._legal_cache = None
+        self._game_state = None
+
+    def _do_pop(self):
+        self._legal_cache = None
+        self._game_state = None
+        return self.board.pop()
 
     def _ai_for_turn(self):
+        return self._turn_to_engine[self.board.turn]
 
-        if self.ai_vs_ai_mode:
-            return self.current_ai if self.board.turn == chess.WHITE else self.second_ai
+    def _engine_name_for_turn(self):
+        # Class name of the engine to move, None when a human is
+        return self._turn_to_engine_name[self.board.turn]
 
-        # Any other mode: look up the entry that was set via the picker
-        return self.engines.get(self.board.turn)
+    def _refresh_turn_engines(self):
+        # Re-resolve which engine plays each colour; called whenever the mode,
+        # the picker entries or the AI vs AI engines change
+        if self.ai_vs_ai_mode:
+            self._turn_to_engine[chess.WHITE] = self.current_ai
+            self._turn_to_engine[chess.BLACK] = self.second_ai
+        else:
+            # Any other mode: the entries that were set via the picker
+            self._turn_to_engine[chess.WHITE] = self.engines[chess.WHITE]
+            self._turn_to_engine[chess.BLACK] = self.engines[chess.BLACK]
+        for turn, engine in enumerate(self._turn_to_engine):
+            self._turn_to_engine_name[turn] = type(engine).__name__ if engine else None
 
 
     def start_game(self):
@@ -130,15 +283,24 @@ class ChessGame:
 
 
         self.stop_ai_vs_ai()
+        self.cancel_ai_search()
 
         # Reset state
         self.board = chess.Board()
+        self._legal_cache = None
+        self._game_state = None
         self.player_color = player_color
         self.ai_thinking = False
         self.game_over = False
         self.move_history = []
-        self.position_evaluations = []
+        self.missing_sans = False
+        self.position_evaluations = deque(maxlen=1024)
+        self.eval_samples = deque(maxlen=256)
+        self.graph_cache = None
+        self.running_eval = self.evaluator.evaluate(self.board)
+        self.evals_before = []
         self.ai_vs_ai_mode = ai_vs_ai
+        self._refresh_turn_engines()
 
 
         # Reset timers do not start until first move
@@ -156,17 +318,17 @@ class ChessGame:
         # If the side to move is an engine, schedule its first move asynchronously
         first_engine = self._ai_for_turn()
         if first_engine is not None:
-            self.ai_thinking = True
-            threading.Thread(
-                target=self._background_ai_move,
-                args=(first_engine,),
-                daemon=True
-            ).start()
+            self.schedule_ai_move(first_engine)
 
     def make_move(self, move: chess.Move) -> bool:
-        if move not in self.board.legal_moves:
+        if move not in self._legal_set():
             return False
 
+        # Hoisted once: this runs for every move of every game
+        board = self.board
+        gui = self.gui
+        bb_squares = chess.BB_SQUARES
+        turn = board.turn
         now = time.time()
 
         # Start the total game clock on the first move
@@ -177,82 +339,225 @@ class ChessGame:
         if self.move_start_time is not None:
             elapsed = now - self.move_start_time
             # previous mover is the side that's about to move right now
-            prev = self.board.turn
-            if prev == chess.WHITE:
+            if turn == chess.WHITE:
                 self.white_thinking_time += elapsed
             else:
                 self.black_thinking_time += elapsed
             self.last_move_time = elapsed
 
-        # Determine which sound to play
-        capture = self.board.is_capture(move)
-        castle = self.board.is_castling(move)
+        # Determine which sound to play, from plain bitboard tests
+        from_square, to_square = move.from_square, move.to_square
+        capture = bool(board.occupied_co[not turn] & bb_squares[to_square]) or board.is_en_passant(move)
+        castle = bool(board.kings & bb_squares[from_square]) and abs(from_square - to_square) == 2
         promotion = bool(move.promotion)
+        eval_delta = self.eval_delta(move)
+        was_endgame = self.positional_evaluator.is_endgame(board)
+
+        # SAN needs a legal move generation pass, so it is only worked out
+        # here while the move list is on screen (see fill_move_sans)
+        if gui.current_tab == "moves":
+            san = board.san(move)
+        else:
+            san = None
+            self.missing_sans = True
 
         # Push the move onto the board
-        san = self.board.san(move)
-        self.board.push(move)
+        self._do_push(move)
+        # Older search results give way to ones for the new position
+        self.tt.generation += 1
         self.move_history.append((move, san))
-        self.position_evaluations.append(self.evaluator.evaluate(self.board))
+        self.evals_before.append(self.running_eval)
+        self.running_eval += eval_delta
         self.game_over = bool(self.check_game_state())
+        # The increments leave out mobility and king safety and use the
+        # pre-move tables, so the full evaluator takes over at every graph
+        # sample, when the endgame tables switch in or out, and for the mate
+        # and draw scores at the end
+        if (self.game_over or len(self.move_history) % EVAL_SAMPLE_STRIDE == 0
+                or self.positional_evaluator.is_endgame(board) != was_endgame):
+            self.force_full_eval()
+        self.record_evaluation(self.running_eval)
+
+        # Play the appropriate sound effect, unless AI vs AI is going too fast to hear them
+        if not (self.ai_vs_ai_running and self.last_move_time < SOUND_MIN_INTERVAL):
+            play_sound = gui.play_sound
+            if capture:
+                play_sound('capture')
+            elif castle:
+                play_sound('castle')
+            elif promotion:
+                play_sound('promote')
+            else:
+                play_sound('move')
 
-        # Play the appropriate sound effect
-        if capture:
-            self.gui.play_sound('capture')
-        elif castle:
-            self.gui.play_sound('castle')
-        elif promotion:
-            self.gui.play_sound('promote')
-        else:
-            self.gui.play_sound('move')
-
-        # Additional sounds for check and game end
-        if self.board.is_check():
-            self.gui.play_sound('check')
-        if self.game_over:
-            self.gui.play_sound('game_end')
-
-        # Redraw & flip immediately so the move appears
-        self.gui.draw_board()
-        pygame.display.flip()
+            # Additional sounds for check and game end
+            if board.is_check():
+                play_sound('check')
+            if self.game_over:
+                play_sound('game_end')
 
-        # Schedule the next AI move if needed
-        if not self.game_over and not self.ai_vs_ai_running:
+        # Schedule the next AI move if needed, paced in AI vs AI so the moves
+        # can be followed
+        if not self.game_over:
             ai = self._ai_for_turn()
             if ai is not None:
-                self.ai_thinking = True
-                threading.Thread(
-                    target=self._background_ai_move,
-                    args=(ai,),
-                    daemon=True
-                ).start()
+                self.schedule_ai_move(ai, self.ai_vs_ai_delay if self.ai_vs_ai_running else 0)
 
         # Mark the start of the next thinking interval
         self.move_start_time = now
         return True
 
-    # Wrapper to call make_ai_move in a background thread.
-    # Resets ai_thinking when done.
-    def _background_ai_move(self, ai_engine):
-        try:
-            self.make_ai_move(ai_engine)
-        finally:
-            self.ai_thinking = False
-
-    def make_ai_move(self, ai) -> None:
-        #Ask `ai` for a move and execute it, no-op if it returns None
-        # Show thinking banner right away
+    def fill_move_sans(self):
+        #Fill in the SAN of moves recorded while the move list was hidden
+        if not self.missing_sans:
+            return
+        # Every game starts from the initial position
+        board = chess.Board()
+        for i, (move, san) in enumerate(self.move_history):
+            if san is None:
+                self.move_history[i] = (move, board.san(move))
+            board.push(move)
+        self.missing_sans = False
+
+    def eval_delta(self, move):
+        #Change in the weighted material + piece-square score made by `move`
+        #(white's point of view), computed before it is pushed
+        board = self.board
+        piece_values = self.material_evaluator.piece_values
+        positional = self.positional_evaluator
+        # values[color][piece_type][square], already signed for white
+        values = positional.square_values[positional.is_endgame(board)]
+        sign = 1 if board.turn == chess.WHITE else -1
+        from_square, to_square = move.from_square, move.to_square
+
+        # The moving piece leaves its square and lands, possibly promoted
+        piece = board.piece_at(from_square)
+        piece_type, color = piece.piece_type, piece.color
+        new_type = move.promotion or piece_type
+        material = sign * (piece_values[new_type] - piece_values[piece_type])
+        position = values[color][new_type][to_square] - values[color][piece_type][from_square]
+
+        # The captured piece disappears; en passant takes the pawn behind the target square
+        if board.is_en_passant(move):
+            captured_square = to_square - 8 * sign
+        else:
+            captured_square = to_square
+        captured = board.piece_at(captured_square)
+        if captured and captured.color != color:
+            material += sign * piece_values[captured.piece_type]
+            position -= values[captured.color][captured.piece_type][captured_square]
+
+        # Castling also moves the rook
+        if board.is_castling(move):
+            rank = chess.square_rank(from_square)
+            if board.is_kingside_castling(move):
+                rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+            else:
+                rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+            position += values[color][chess.ROOK][rook_to] - values[color][chess.ROOK][rook_from]
+
+        weights = self.eval_weights
+        return (material * weights.get(self.material_evaluator, 0)
+                + position * weights.get(positional, 0))
+
+    def force_full_eval(self):
+        #Resync the running evaluation with the full evaluator on the current position
+        self.running_eval = self.evaluator.evaluate(self.board)
+        return self.running_eval
+
+    def record_evaluation(self, score):
+        #Record the evaluation of the position just reached
+        self.graph_cache = None
+        self.position_evaluations.append(score)
+        if len(self.move_history) % EVAL_SAMPLE_STRIDE == 0:
+            self.eval_samples.append(score)
+
+    def graph_evaluations(self):
+        #Downsampled evaluation history for the graph, ending at the current position
+        if self.graph_cache is None:
+            points = list(self.eval_samples)
+            if self.position_evaluations and len(self.move_history) % EVAL_SAMPLE_STRIDE:
+                points.append(self.position_evaluations[-1])
+            self.graph_cache = tuple(points)
+        return self.graph_cache
+
+    def schedule_ai_move(self, ai_engine, delay=0):
+        #Queue a search by `ai_engine` on a snapshot of the current position
+        # Flag thinking so the banner shows immediately
         self.ai_thinking = True
-        self.gui.draw_board()
-
-        # find the move this takes some time when calling big algos
-        ai_move = ai.get_best_move(self.board.copy())
+        self.ai_stop = threading.Event()
+        self._ai_jobs.put((ai_engine, self.board.move_stack.copy(), delay, self.ai_stop))
 
-        # Done thinking
+    def cancel_ai_search(self):
+        #Abandon the queued or running search, if any; its engine stops at the next node
+        self.ai_stop.set()
         self.ai_thinking = False
 
-        # Execute the best move found using make_move
-        if ai_move and ai_move in self.board.legal_moves:
+    def _ai_worker(self):
+        # Runs the queued searches one at a time for the lifetime of the game.
+        # It never touches self.board: the result is posted to the main loop,
+        # which applies it through apply_ai_move
+        while True:
+            ai_engine, moves, delay, stop_flag = self._ai_jobs.get()
+            if delay:
+                time.sleep(delay)
+            if stop_flag.is_set():
+                continue
+            board = self._sync_scratch(ai_engine, moves)
+            fen = board.fen()
+            ai_engine.stop_flag = stop_flag
+            try:
+                # find the move this takes some time when calling big algos
+                ai_move = ai_engine.get_best_move(board)
+            except SearchCancelled:
+                # The game moved on; the scratch board is resynced next time
+                continue
+            except Exception as e:
+                print(f"Error in AI search: {e}")
+                ai_move = None
+            finally:
+                # The flag belongs to this job only; a later search by the same
+                # engine (e.g. a hint on the main thread) must not inherit it
+                ai_engine.stop_flag = None
+            pygame.event.post(pygame.event.Event(AI_MOVE_READY, move=ai_move, fen=fen, job=stop_flag))
+
+    def _sync_scratch(self, ai_engine, moves):
+        # Bring the engine's scratch board to the position after `moves` (all
+        # games start from the initial position): undo back to the common
+        # prefix, then replay the rest, usually just the last move or two
+        scratch = self.scratch_boards.get(ai_engine)
+        if scratch is None:
+            scratch = self.scratch_boards[ai_engine] = chess.Board()
+
+        stack = scratch.move_stack
+        common = 0
+        limit = min(len(stack), len(moves))
+        while common < limit and stack[common] == moves[common]:
+            common += 1
+
+        if common == 0:
+            scratch.reset()
+        while len(stack) > common:
+            scratch.pop()
+        for move in moves[common:]:
+            scratch.push(move)
+        return scratch
+
+    def apply_ai_move(self, ai_move, fen, job) -> None:
+        #Execute a move found by the AI worker (main thread only), no-op if it
+        #returned None or the position changed while it was searching
+        if job is not self.ai_stop:
+            # Superseded by a later search, which is still thinking
+            return
+        if job.is_set():
+            # Cancelled with nothing queued after it (e.g. the side was
+            # handed to a human); searches that don't poll the flag still
+            # report back, but their move must not be played
+            return
+        self.ai_thinking = False
+        if ai_move is None or fen != self.board.fen():
+            return
+        if ai_move in self._legal_set():
             self.make_move(ai_move)
 
     def start_ai_vs_ai(self) -> None:
@@ -260,74 +565,76 @@ class ChessGame:
         if self.ai_vs_ai_running:
             return
         self.ai_vs_ai_running = True
-        self.ai_vs_ai_thread = threading.Thread(target=self.ai_vs_ai_loop,
-                                                daemon=True)
-        self.ai_vs_ai_thread.start()
+        # Kick off the side to move; make_move schedules every ply after that
+        engine = self._ai_for_turn()
+        if engine and not self.ai_thinking and not self.game_over:
+            self.schedule_ai_move(engine)
 
     def stop_ai_vs_ai(self) -> None:
+        # Takes effect immediately: the in-flight search stops at its next node
         self.ai_vs_ai_running = False
-        if self.ai_vs_ai_thread and self.ai_vs_ai_thread.is_alive():
-            self.ai_vs_ai_thread.join(0.5)
-
-    def ai_vs_ai_loop(self) -> None:
-        while self.ai_vs_ai_running and not self.game_over:
-            engine = self._ai_for_turn()  # engine for the *current* side
-            if engine:
-                self.make_ai_move(engine)  # makes one ply, returns quickly
-            time.sleep(self.ai_vs_ai_delay)  # small pause so the GUI can redraw
+        self.cancel_ai_search()
     
     def set_ai_delay(self, delay):
         #Set delay between AI moves in AI vs AI mode so i can see moves unfold
-        self.ai_vs_ai_delay = max(1.0, min(5.0, delay))  # Clamp between 0.1 and 5 seconds
+        self.ai_vs_ai_delay = max(0.0, min(5.0, delay))  # Clamp between 0 and 5 seconds
     
     def undo_move(self):
         # Undo the last move(s) made and remove it from the board
         # Stop AI vs AI if running
         if self.ai_vs_ai_running:
             self.stop_ai_vs_ai()
+        self.cancel_ai_search()
             
         if len(self.move_history) > 0:
             # Undo player's move
-            self.board.pop()
-            self.move_history.pop()
+            self.undo_ply()
             
             # If we also need to undo AI's move
             if not self.ai_vs_ai_mode and len(self.move_history) > 0 and self.board.turn != self.player_color:
-                self.board.pop()
-                self.move_history.pop()
-            
-            # Update evaluations
-            if len(self.position_evaluations) > 0:
-                self.position_evaluations.pop()
-            if not self.ai_vs_ai_mode and len(self.position_evaluations) > 0 and self.board.turn != self.player_color:
-                self.position_evaluations.pop()
+                self.undo_ply()
                 
             self.game_over = False
     
+    def undo_ply(self):
+        #Take back one ply together with its history entry and evaluation
+        self.graph_cache = None
+        if len(self.move_history) % EVAL_SAMPLE_STRIDE == 0 and self.eval_samples:
+            self.eval_samples.pop()
+        if self.position_evaluations:
+            self.position_evaluations.pop()
+        self._do_pop()
+        self.move_history.pop()
+        self.running_eval = self.evals_before.pop()
+    
     def set_ai_algorithm(self, algorithm_name, second_ai=False):
 
         if algorithm_name in self.ai_algorithms:
             if second_ai:
-                self.second_ai = self.ai_algorithms[algorithm_name]
+                self.second_ai = self._get_ai(algorithm_name)
             else:
-                self.current_ai = self.ai_algorithms[algorithm_name]
+                self.current_ai = self._get_ai(algorithm_name)
+            self._refresh_turn_engines()
     
     def check_game_state(self):
-        #Check if the game is over
-        if self.board.is_checkmate():
-            self.game_over = True
-            return "checkmate"
-        elif self.board.is_stalemate():
+        #Check if the game is over; worked out once per position
+        if self._game_state is None:
+            self._game_state = (self.compute_game_state(),)
+        state = self._game_state[0]
+        if state:
             self.game_over = True
-            return "stalemate"
+        return state
+
+    def compute_game_state(self):
+        # No legal moves: mate or stalemate, from the cached legal move set
+        if not self._legal_set():
+            return "checkmate" if self.board.is_check() else "stalemate"
         elif self.board.is_insufficient_material():
-            self.game_over = True
             return "insufficient material"
         elif self.board.is_fifty_moves():
-            self.game_over = True
             return "fifty-move rule"
-        elif self.board.is_repetition():
-            self.game_over = True
+        # A third occurrence needs at least 8 reversible plies
+        elif self.board.halfmove_clock >= 8 and self.board.is_repetition(3):
             return "threefold repetition"
         return None
 
@@ -336,31 +643,22 @@ class ChessGame:
         if depth in self.depth_options:
             if for_white:
                 self.white_ai_depth = depth
-                # Update depth for depth-based algos
-                for name, ai in self.ai_algorithms.items():
-                    if "Depth" in name and ai == self.current_ai:
-                        if isinstance(ai, MinimaxAI):
-                            self.current_ai = MinimaxAI(self.evaluator, depth)
-                        elif isinstance(ai, AlphaBetaAI):
-                            self.current_ai = AlphaBetaAI(self.evaluator, depth)
-                        elif isinstance(ai, NegamaxAI):
-                            self.current_ai = NegamaxAI(self.evaluator, depth)
-                        elif isinstance(ai, QuiescenceSearchAI):
-                            self.current_ai = QuiescenceSearchAI(self.evaluator, depth, 3)
-                        elif isinstance(ai, AdvancedModeAI):
-                            self.current_ai = AdvancedModeAI(self.evaluator, depth)
+                self.current_ai = self.rebuild_with_depth(self.current_ai, depth)
             else:
                 self.black_ai_depth = depth
-                # Update depth for depth-based algos
-                for name, ai in self.ai_algorithms.items():
-                    if "Depth" in name and ai == self.second_ai:
-                        if isinstance(ai, MinimaxAI):
-                            self.second_ai = MinimaxAI(self.evaluator, depth)
-                        elif isinstance(ai, AlphaBetaAI):
-                            self.second_ai = AlphaBetaAI(self.evaluator, depth)
-                        elif isinstance(ai, NegamaxAI):
-                            self.second_ai = NegamaxAI(self.evaluator, depth)
-                        elif isinstance(ai, QuiescenceSearchAI):
-                            self.second_ai = QuiescenceSearchAI(self.evaluator, depth, 3)
-                        elif isinstance(ai, AdvancedModeAI):
-                            self.second_ai = AdvancedModeAI(self.evaluator, depth)
+                self.second_ai = self.rebuild_with_depth(self.second_ai, depth)
+            self._refresh_turn_engines()
+
+    def rebuild_with_depth(self, ai, depth):
+        #Same kind of engine at a new depth; engines without a depth are kept
+        factory = _DEPTH_FACTORIES.get(type(ai))
+        if factory is None:
+            return ai
+        # Replaced by the new engine; drop the cached instance
+        name = self._ai_names.pop(ai, None)
+        if name is not None:
+            del self._ai_cache[name]
+        engine = factory(self, depth)
+        # Keep the root split of the engine it replaces
+        engine.workers = ai.workers
+        return engine
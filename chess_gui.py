@@ -7,6 +7,35 @@ import math
 import random
 import time
 
+# Posted by the AI worker thread when a search finishes (attributes: move,
+# fen of the searched position, job = the search's stop flag)
+AI_MOVE_READY = pygame.USEREVENT + 1
+# Fired a few times a second so an idle window still sees its clocks tick over
+CLOCK_TICK = pygame.USEREVENT + 2
+CLOCK_TICK_MS = 250
+# Rendered text surfaces kept before the cache starts over (see render_text)
+TEXT_CACHE_SIZE = 512
+# Side of the piece icons in the promotion menu
+PROMOTION_ICON_SIZE = 50
+# Stats tab castling line for each of the 16 sets of castling rooks, keyed by
+# the corner bits of board.clean_castling_rights()
+_CASTLING_LABELS = ((chess.BB_H1, "White O-O"), (chess.BB_A1, "White O-O-O"),
+                    (chess.BB_H8, "Black O-O"), (chess.BB_A8, "Black O-O-O"))
+CASTLING_RIGHTS_LINES = {
+    mask: "Castling Rights: " + (", ".join(label for bb, label in _CASTLING_LABELS if mask & bb) or "None")
+    for mask in (sum(bb for i, (bb, _) in enumerate(_CASTLING_LABELS) if n >> i & 1) for n in range(16))
+}
+# Stats tab status line for each ChessGame.check_game_state() result, then
+# by side to move while the game is on, and the check line by is_check()
+GAME_STATUS_LINES = {
+    state: f"Game Status: {state.capitalize()}"
+    for state in ("checkmate", "stalemate", "insufficient material",
+                  "fifty-move rule", "threefold repetition")
+}
+TURN_STATUS_LINES = {chess.WHITE: "Game Status: White to move",
+                     chess.BLACK: "Game Status: Black to move"}
+CHECK_STATUS_LINES = ("Check Status: Not in check", "Check Status: In check")
+
 class ChessGUI:
 
     
@@ -23,6 +52,9 @@ class ChessGUI:
         # Create the window
         self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
         pygame.display.set_caption("LoveChess")
+        # Pre-filled translucent surfaces for the dimming overlays, by
+        # (alpha, size); see dim_screen
+        self.overlays_by_alpha = {}
         
         # Load chess piece images
         self.pieces = {}
@@ -30,13 +62,30 @@ class ChessGUI:
         
         # Initialize sound effects, going to leave it empty ofr now
         pygame.mixer.init()
-        self.sounds = {
-            'move': pygame.mixer.Sound('assets/sounds/move.wav') if os.path.exists('assets/sounds/move.wav') else None,
-            'capture': pygame.mixer.Sound('assets/sounds/capture.wav') if os.path.exists('assets/sounds/capture.wav') else None,
-            'check': pygame.mixer.Sound('assets/sounds/check.wav') if os.path.exists('assets/sounds/check.wav') else None,
-            'castle': pygame.mixer.Sound('assets/sounds/castle.wav') if os.path.exists('assets/sounds/castle.wav') else None,
-            'promote': pygame.mixer.Sound('assets/sounds/promote.wav') if os.path.exists('assets/sounds/promote.wav') else None,
-            'game_end': pygame.mixer.Sound('assets/sounds/game_end.wav') if os.path.exists('assets/sounds/game_end.wav') else None
+        # Only the files that exist are kept; each is decoded the first time
+        # it is played (see sound)
+        self.sound_paths = {
+            name: path for name, path in (
+                ('move', 'assets/sounds/move.wav'),
+                ('capture', 'assets/sounds/capture.wav'),
+                ('check', 'assets/sounds/check.wav'),
+                ('castle', 'assets/sounds/castle.wav'),
+                ('promote', 'assets/sounds/promote.wav'),
+                ('game_end', 'assets/sounds/game_end.wav'),
+            ) if os.path.exists(path)
+        }
+        self.sounds = {}
+        # Reserved channels, so an effect never waits for a free one: the move
+        # sounds share one, check and game end get their own
+        pygame.mixer.set_reserved(3)
+        move_channel = pygame.mixer.Channel(0)
+        self.sound_channels = {
+            'move': move_channel,
+            'capture': move_channel,
+            'castle': move_channel,
+            'promote': move_channel,
+            'check': pygame.mixer.Channel(1),
+            'game_end': pygame.mixer.Channel(2)
         }
 
         # Background music attributes
@@ -52,10 +101,17 @@ class ChessGUI:
         self.move_indicator = (100, 200, 255, 150)
         self.check_color = (255, 0, 0, 150)
         self.hint_color = (0, 191, 255, 180)
+        self.build_square_cache()
         
         # UI state
         self.selected_square = None
+        # The piece on selected_square, captured when it was selected
+        self.selected_piece = None
         self.legal_moves = []
+        # Target squares of legal_moves from selected_square, and the
+        # (selected_square, legal_moves list) they were worked out from
+        self.legal_targets = frozenset()
+        self.legal_targets_src = (None, None)
         self.current_tab = "stats"  # "moves", "analysis", "stats"
         self.dragging = False
         self.drag_piece = None
@@ -67,6 +123,39 @@ class ChessGUI:
 
         self.show_game_over_popup = True
         self.game_end_time = None
+        # Repaint bookkeeping: the whole window is only redrawn after an
+        # event, otherwise just the clock block when its text changes
+        self.needs_redraw = True
+        self.clock_secs = None
+        self.clock_rect = None
+        # Where the dragged piece was last drawn, for drag-only repaints
+        self.drag_rect = None
+        # Rendered text by (text, font, colour); labels repeat frame after frame
+        self.text_surfs = {}
+        # Analysis tab lines and the position they were worked out for
+        self.analysis_key = None
+        self.analysis_lines = []
+        # Evaluation graph polyline, and the (evaluations, graph rect) it was
+        # worked out from
+        self.graph_points = []
+        self.graph_src = (None, None)
+        # "<engine> is thinking…" banner text by engine name
+        self.thinking_texts = {}
+        # Last drawn stats/analysis tab box and the state it shows (see draw_ui)
+        self.tab_key = None
+        self.tab_surf = None
+        # Bottom control panel, rebuilt when what it shows changes
+        self.controls_key = None
+        self.control_rects = {}
+        # Pop-up boxes, rendered once: the Game Over box (all but its result
+        # line) and the AI selection menu for the (colour, engine names) key,
+        # with their button hit boxes relative to the box
+        self.game_over_box = None
+        self.game_over_box_rects = {}
+        self.ai_menu_key = None
+        self.ai_menu_surf = None
+        self.ai_menu_rects = {}
+        self.ai_menu_origin = (0, 0)
         # Fonts
         pygame.font.init()
         self.font = pygame.font.SysFont("Arial", 16)
@@ -101,12 +190,21 @@ class ChessGUI:
         else:
             print(f"Background music file '{music_path}' not found.")
 
+    def dim_screen(self, alpha, area=None):
+        """Darken the whole window, or just `area` of it, with a pre-filled overlay surface"""
+        size = area.size if area is not None else (self.width, self.height)
+        overlay = self.overlays_by_alpha.get((alpha, size))
+        if overlay is None:
+            # Filled once per alpha and size; the pop-ups then cost one blit a frame
+            overlay = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+            overlay.fill((0, 0, 0, alpha))
+            self.overlays_by_alpha[(alpha, size)] = overlay
+        self.screen.blit(overlay, area.topleft if area is not None else (0, 0))
+
     def draw_promotion_menu(self):
 
         # semi-transparent full-screen overlay
-        overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        self.screen.blit(overlay, (0, 0))
+        self.dim_screen(180)
 
         # menu dimensions
         menu_w, menu_h = 240, 60
@@ -129,17 +227,16 @@ class ChessGUI:
             (chess.BISHOP, 'B'),
             (chess.KNIGHT, 'N'),
         ]
-        icon_size = fifty = menu_h - 10
+        icon_size = PROMOTION_ICON_SIZE
         gap = (menu_w - 4 * icon_size) // 5
         x = mx + gap
 
         self.promotion_rects.clear()
         for piece_type, sym in choices:
-            # pick correct key for self.pieces (uppercase for white, lowercase for black)
+            # pick correct key for the icons (uppercase for white, lowercase for black)
             key = sym if is_white else sym.lower()
-            img = pygame.transform.scale(self.pieces[key], (icon_size, icon_size))
             rect = pygame.Rect(x, my + 5, icon_size, icon_size)
-            self.screen.blit(img, rect.topleft)
+            self.screen.blit(self.promotion_icons[key], rect.topleft)
             self.promotion_rects[piece_type] = rect
             x += icon_size + gap
 
@@ -150,21 +247,45 @@ class ChessGUI:
             'p': 'bp', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'
         }
         
+        # The PNGs are only read once; resizes just rescale these
+        self.pieces_raw = {}
+        self.scaled_pieces = {}
         for piece_char, filename in piece_mapping.items():
             try:
                 img_path = os.path.join('assets', 'pieces', f"{filename}.png")
-                img = pygame.image.load(img_path)
-                img = pygame.transform.scale(img, (self.square_size, self.square_size))
-                self.pieces[piece_char] = img
+                # Match the display's pixel format so blits need no conversion
+                self.pieces_raw[piece_char] = pygame.image.load(img_path).convert_alpha()
             except pygame.error as e:
                 print(f"Error loading piece image {filename}: {e}")
-                # Create a fallback colored square with text
-                fallback = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                fallback.fill((200, 200, 200, 200))
-                text = self.font.render(piece_char, True, (0, 0, 0))
-                fallback.blit(text, (self.square_size//2 - text.get_width()//2, 
-                                    self.square_size//2 - text.get_height()//2))
-                self.pieces[piece_char] = fallback
+                self.pieces_raw[piece_char] = None
+
+        self.scale_pieces()
+
+        # The promotion menu always shows the same four pieces at one size
+        self.promotion_icons = {}
+        for piece_char in 'QRBNqrbn':
+            src = self.pieces_raw[piece_char] or self.pieces[piece_char]
+            icon = pygame.transform.scale(src, (PROMOTION_ICON_SIZE, PROMOTION_ICON_SIZE))
+            self.promotion_icons[piece_char] = icon.convert_alpha()
+
+    def scale_pieces(self):
+        """Point self.pieces at the images for the current square size, scaling them on first use"""
+        size = self.square_size
+        if size not in self.scaled_pieces:
+            scaled = {}
+            for piece_char, img in self.pieces_raw.items():
+                if img is not None:
+                    scaled[piece_char] = pygame.transform.scale(img, (size, size)).convert_alpha()
+                else:
+                    # Create a fallback colored square with text
+                    fallback = pygame.Surface((size, size), pygame.SRCALPHA)
+                    fallback.fill((200, 200, 200, 200))
+                    text = self.font.render(piece_char, True, (0, 0, 0))
+                    fallback.blit(text, (size//2 - text.get_width()//2,
+                                         size//2 - text.get_height()//2))
+                    scaled[piece_char] = fallback.convert_alpha()
+            self.scaled_pieces[size] = scaled
+        self.pieces = self.scaled_pieces[size]
     
     def resize(self, width, height):
         """Handle window resize events"""
@@ -172,44 +293,236 @@ class ChessGUI:
         self.board_size = min(self.height - 50, 600)
         self.square_size = self.board_size // 8
         self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+        self.overlays_by_alpha = {}
         
-        # Reload pieces with new size
-        self.load_pieces()
+        # Rescale pieces and square overlays to the new size
+        self.scale_pieces()
+        self.build_square_cache()
+
+    def build_square_cache(self):
+        """Pre-render the translucent square overlays for the current square size"""
+        size = (self.square_size, self.square_size)
+        self.overlays = {}
+        for name, color in (('highlight', self.highlight_color), ('move', self.move_indicator),
+                            ('hint', self.hint_color), ('check', self.check_color)):
+            surf = pygame.Surface(size, pygame.SRCALPHA)
+            surf.fill(color)
+            self.overlays[name] = surf.convert_alpha()
+        # Square position tables by (origin, square size, side); see square_positions
+        self.square_xy_tables = {}
+        self.board_bg_key = None
+        self.board_layer_key = None
+        # Board geometry for the mouse handlers: the board rect, edges
+        # included, and per pixel along each axis the file and the square
+        # offset of the rank (by side). The board may be a few pixels wider
+        # than its 8 squares; that strip belongs to the edge squares
+        board_x = (self.width - self.board_size) // 2
+        self.board_rect = pygame.Rect(board_x, 50, self.board_size + 1, self.board_size + 1)
+        cells = [min(d // self.square_size, 7) for d in range(self.board_size + 1)]
+        self.file_at = tuple(cells)
+        self.rank_offset_at = {
+            chess.WHITE: tuple(8 * (7 - c) for c in cells),
+            chess.BLACK: tuple(8 * c for c in cells),
+        }
+
+    def square_positions(self, board_x, board_y):
+        """Top-left pixel of each square; one table per layout and side, kept until the next resize"""
+        key = (board_x, board_y, self.game.player_color)
+        table = self.square_xy_tables.get(key)
+        if table is None:
+            white = self.game.player_color == chess.WHITE
+            table = self.square_xy_tables[key] = [
+                (board_x + chess.square_file(sq) * self.square_size,
+                 board_y + (7 - chess.square_rank(sq) if white else chess.square_rank(sq)) * self.square_size)
+                for sq in chess.SQUARES
+            ]
+        return table
+
+    def square_at(self, pos):
+        """The square under pixel pos on the board, the inverse of square_positions"""
+        x = pos[0] - self.board_rect.x
+        y = pos[1] - self.board_rect.y
+        return self.rank_offset_at[self.game.player_color][y] + self.file_at[x]
+
+    def board_layer(self):
+        """The board background with its highlights and pieces composed on top.
+
+        Drawn at the same place as board_background, and rebuilt only when the
+        position, the highlights, the dragged piece or the background change.
+        """
+        board = self.game.board
+        selected = self.selected_square
+
+        # 2) legal-move targets; the handlers assign a fresh list on every
+        # selection, so they only change along with it
+        if selected is not None:
+            moves = self.legal_moves
+            src_square, src_moves = self.legal_targets_src
+            if src_square != selected or src_moves is not moves:
+                self.legal_targets = frozenset(move.to_square for move in moves if move.from_square == selected)
+                self.legal_targets_src = (selected, moves)
+            targets = self.legal_targets
+        else:
+            targets = frozenset()
+        # 3) hint move, if active
+        if self.show_hint and self.hint_move:
+            hint = (self.hint_move.from_square, self.hint_move.to_square)
+        else:
+            hint = ()
+        # 4) king in check
+        check = board.king(board.turn) if board.is_check() else None
+        # the piece being dragged is drawn separately
+        skip = selected if self.dragging else None
+        bg = self.board_background()
+
+        key = (board._transposition_key(), selected, targets, hint, check, skip, bg)
+        if key != self.board_layer_key:
+            layer = bg.copy()
+            # Square positions inside the layer, past the rank label margin
+            square_xy = self.square_positions(20, 0)
+            overlays = self.overlays
+
+            # Highlights and move-indicators, each on its own squares only
+            overlay_blits = []
+            # 1) highlight selected square
+            if selected is not None:
+                overlay_blits.append((overlays['highlight'], square_xy[selected]))
+            overlay_blits.extend((overlays['move'], square_xy[sq]) for sq in targets)
+            overlay_blits.extend((overlays['hint'], square_xy[sq]) for sq in hint)
+            if check is not None:
+                overlay_blits.append((overlays['check'], square_xy[check]))
+            layer.blits(overlay_blits, doreturn=False)
+
+            # Pieces (skip the one being dragged)
+            pieces = self.pieces
+            layer.blits([(pieces[piece.symbol()], square_xy[sq])
+                         for sq, piece in board.piece_map().items() if sq != skip],
+                        doreturn=False)
+
+            self.board_layer_surf = layer
+            self.board_layer_key = key
+        return self.board_layer_surf
+
+    def board_background(self):
+        """The squares plus file and rank labels, rendered once per size and side.
+
+        Blitted at (board_x - 20, board_y), leaving room for the rank labels.
+        """
+        key = (self.board_size, self.square_size, self.game.player_color)
+        if key != self.board_bg_key:
+            bg = pygame.Surface((self.board_size + 20, self.board_size + 30)).convert()
+            # The margin around the squares is keyed out so it never covers the clocks
+            bg.fill((240, 240, 240))
+            bg.set_colorkey((240, 240, 240), pygame.RLEACCEL)
+            sq_size = self.square_size
+            white = self.game.player_color == chess.WHITE
+            for sq in chess.SQUARES:
+                file, rank = chess.square_file(sq), chess.square_rank(sq)
+                color = self.light_square if (rank + file) % 2 == 0 else self.dark_square
+                row = 7 - rank if white else rank
+                pygame.draw.rect(bg, color, (20 + file * sq_size, row * sq_size, sq_size, sq_size))
+
+            # File & rank labels
+            for i in range(8):
+                # Files (a–h)
+                f_label = self.render_text(chess.FILE_NAMES[i])
+                bg.blit(f_label, (20 + i * sq_size + sq_size // 2 - f_label.get_width() // 2,
+                                  self.board_size + 5))
+                # Ranks (1–8)
+                rank = i if not white else 7 - i
+                r_label = self.render_text(str(rank + 1))
+                bg.blit(r_label, (5, i * sq_size + sq_size // 2 - r_label.get_height() // 2))
+
+            self.board_bg = bg
+            self.board_bg_key = key
+        return self.board_bg
     
     def main_loop(self):
         """Main game loop"""
-        clock = pygame.time.Clock()
+        pygame.time.set_timer(CLOCK_TICK, CLOCK_TICK_MS)
+        frame_clock = pygame.time.Clock()
         running = True
 
         while running:
-            # Handle events
-            for event in pygame.event.get():
+            # Sleep until something happens, then handle everything queued
+            pending_resize = None
+            drag_moved = False
+            for event in [pygame.event.wait()] + pygame.event.get():
+                if event.type == CLOCK_TICK:
+                    continue
+                if event.type == pygame.MOUSEMOTION:
+                    # Hovering changes nothing on screen, and moving a piece
+                    # that is already being dragged only changes the area
+                    # around it; starting a drag lifts it off the board
+                    was_dragging = self.dragging
+                    self.handle_mouse_motion(event)
+                    if self.dragging:
+                        if was_dragging:
+                            drag_moved = True
+                        else:
+                            self.needs_redraw = True
+                    continue
+                # Anything else may have changed what is on screen
+                self.needs_redraw = True
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.VIDEORESIZE:
-                    self.resize(event.w, event.h)
+                    # Window drags send bursts of these; only the last one matters
+                    pending_resize = (event.w, event.h)
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     self.handle_mouse_down(event)
                 elif event.type == pygame.MOUSEBUTTONUP:
                     self.handle_mouse_up(event)
-                elif event.type == pygame.MOUSEMOTION:
-                    self.handle_mouse_motion(event)
                 elif event.type == pygame.KEYDOWN:
                     self.handle_key_press(event)
-            
-            # Draw the game
-            self.draw_board()
-            
-            # Update display
-            pygame.display.flip()
-            
-            # Cap the frame rate
-            clock.tick(60)
-
-    def draw_clocks(self):
-        """Draw game timing clocks at the top-left corner."""
-        x, y = 20, 20
-
+                elif event.type == AI_MOVE_READY:
+                    # Moves are only ever applied here, on the main thread
+                    self.game.apply_ai_move(event.move, event.fen, event.job)
+
+            if pending_resize:
+                self.resize(*pending_resize)
+
+            if self.needs_redraw:
+                self.needs_redraw = False
+                # Draw the game
+                self.draw_board()
+
+                # Update display
+                pygame.display.flip()
+                # Input bursts (drags, mouse motion) repaint at most 60 times a second
+                frame_clock.tick(60)
+            elif drag_moved:
+                # Recompose the frame, but only push where the dragged piece
+                # was and is now (plus the clocks, which draw_board repaints)
+                prev_drag_rect = self.drag_rect
+                self.draw_board()
+                pygame.display.update([prev_drag_rect, self.drag_rect, self.clock_rect])
+                frame_clock.tick(60)
+            elif self.clocks_covered():
+                # Only the clocks can have moved on, but under a dimmed pop-up:
+                # a patch would show through it, so recompose the whole frame
+                if self.clock_seconds() != self.clock_secs:
+                    self.draw_board()
+                    pygame.display.flip()
+            else:
+                # Only the clocks can have moved on: push just their rect
+                clock_rect = self.draw_clocks(only_if_changed=True)
+                if clock_rect:
+                    pygame.display.update(clock_rect)
+
+    def render_text(self, text, font=None, colour=(0, 0, 0)):
+        """font.render(text, True, colour), rasterised once and then served from a cache"""
+        font = font or self.font
+        key = (text, font, colour)
+        surf = self.text_surfs.get(key)
+        if surf is None:
+            if len(self.text_surfs) >= TEXT_CACHE_SIZE:
+                self.text_surfs.clear()
+            surf = self.text_surfs[key] = font.render(text, True, colour).convert_alpha()
+        return surf
+
+    def clock_seconds(self):
+        """Whole seconds on the four clocks: game, white, black and last move"""
         # 1) If the game just ended, stamp the end time and
         #    flush any remaining interval into the next side’s total.
         if self.game.game_over:
@@ -238,23 +551,52 @@ class ChessGUI:
         black_think = self.game.black_thinking_time
         last_move = self.game.last_move_time
 
+        return (int(total_game), int(white_think), int(black_think), int(last_move))
+
+    def clocks_covered(self):
+        """Whether a full-window pop-up is dimming the clocks"""
+        return (self.show_ai_menu or self.show_promotion_menu
+                or (self.game.game_over and self.show_game_over_popup))
+
+    def draw_clocks(self, only_if_changed=False):
+        """Draw game timing clocks at the top-left corner and return their rect.
+
+        With only_if_changed, the block is repainted over the previous frame,
+        and nothing is drawn (None is returned) while its text is unchanged.
+        """
+        x, y = 20, 20
+
+        # Only whole seconds are shown; nothing to do until one of them ticks over
+        secs = self.clock_seconds()
+        if only_if_changed and secs == self.clock_secs:
+            return None
+
         # 3) Helper to format MM:SS
         def fmt(sec):
-            m = int(sec) // 60
-            s = int(sec) % 60
+            m, s = divmod(sec, 60)
             return f"{m:02d}:{s:02d}"
 
         # 4) Render lines
-        for i, text in enumerate([
-            f"Total Game Time:           {fmt(total_game)}",
-            f"Total White Thinking Time: {fmt(white_think)}",
-            f"Total Black Thinking Time: {fmt(black_think)}",
-            f"Last Move Time:            {fmt(last_move)}",
-        ]):
-            surf = self.font.render(text, True, (0, 0, 0))
-            line_h = self.font.get_linesize() + 2
+        lines = [
+            f"Total Game Time:           {fmt(secs[0])}",
+            f"Total White Thinking Time: {fmt(secs[1])}",
+            f"Total Black Thinking Time: {fmt(secs[2])}",
+            f"Last Move Time:            {fmt(secs[3])}",
+        ]
+        line_h = self.font.get_linesize() + 2
+        surfs = [self.render_text(text) for text in lines]
+        rect = pygame.Rect(x, y, max(surf.get_width() for surf in surfs), line_h * len(surfs))
+        if only_if_changed and self.clock_rect:
+            # Wipe the old text before drawing the new one in its place
+            rect.union_ip(self.clock_rect)
+            self.screen.fill((240, 240, 240), rect)
+        for i, surf in enumerate(surfs):
             self.screen.blit(surf, (x, y + i * line_h))
 
+        self.clock_secs = secs
+        self.clock_rect = rect
+        return rect
+
     def draw_board(self):
         """Draw the chess board and pieces"""
         # Clear the screen
@@ -270,105 +612,17 @@ class ChessGUI:
         # Draw turn indicator
         self.draw_turn_indicator(board_x, board_y - 30)
 
-        # Draw board squares, highlights and move‐indicators
-        for row in range(8):
-            for col in range(8):
-                # Screen coords
-                x = board_x + col * self.square_size
-                if self.game.player_color == chess.WHITE:
-                    y = board_y + (7 - row) * self.square_size
-                else:
-                    y = board_y + row * self.square_size
-
-                # Square color
-                color = self.light_square if (row + col) % 2 == 0 else self.dark_square
-                pygame.draw.rect(self.screen, color, (x, y, self.square_size, self.square_size))
-
-                # Board‐index mapping corrected:
-                if self.game.player_color == chess.WHITE:
-                    square_idx = row * 8 + col
-                else:
-                    square_idx = (7 - row) * 8 + col
-
-                # 1) highlight selected square
-                if self.selected_square is not None and square_idx == self.selected_square:
-                    hl = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    hl.fill(self.highlight_color)
-                    self.screen.blit(hl, (x, y))
-
-                # 2) highlight legal moves
-                for move in self.legal_moves:
-                    if move.from_square == self.selected_square:
-                        to_sq = move.to_square
-                        to_col = to_sq % 8
-                        to_row = to_sq // 8
-                        if self.game.player_color == chess.WHITE:
-                            vy = board_y + (7 - to_row) * self.square_size
-                        else:
-                            vy = board_y + to_row * self.square_size
-                        vx = board_x + to_col * self.square_size
-                        indic = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                        indic.fill(self.move_indicator)
-                        self.screen.blit(indic, (vx, vy))
-
-                # 3) highlight hint move, if active
-                if self.show_hint and self.hint_move:
-                    for sq in (self.hint_move.from_square, self.hint_move.to_square):
-                        c = sq % 8
-                        r = sq // 8
-                        if self.game.player_color == chess.WHITE:
-                            hy = board_y + (7 - r) * self.square_size
-                        else:
-                            hy = board_y + r * self.square_size
-                        hx = board_x + c * self.square_size
-                        hint_surf = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                        hint_surf.fill(self.hint_color)
-                        self.screen.blit(hint_surf, (hx, hy))
-
-                # 4) highlight king in check
-                if self.game.board.is_check():
-                    ks = self.game.board.king(self.game.board.turn)
-                    if square_idx == ks:
-                        chk = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                        chk.fill(self.check_color)
-                        self.screen.blit(chk, (x, y))
-
-        # Draw file & rank labels
-        for i in range(8):
-            # Files (a–h)
-            f_label = self.font.render(chess.FILE_NAMES[i], True, (0, 0, 0))
-            self.screen.blit(f_label,
-                             (board_x + i * self.square_size + self.square_size // 2 - f_label.get_width() // 2,
-                              board_y + self.board_size + 5))
-            # Ranks (1–8)
-            rank = i if self.game.player_color == chess.BLACK else 7 - i
-            r_label = self.font.render(str(rank + 1), True, (0, 0, 0))
-            self.screen.blit(r_label,
-                             (board_x - 15,
-                              board_y + i * self.square_size + self.square_size // 2 - r_label.get_height() // 2))
-
-        # Draw pieces (skip the one being dragged)
-        for row in range(8):
-            for col in range(8):
-                if self.game.player_color == chess.WHITE:
-                    square_idx = row * 8 + col
-                else:
-                    square_idx = (7 - row) * 8 + col
-                piece = self.game.board.piece_at(square_idx)
-                if piece and (not self.dragging or square_idx != self.selected_square):
-                    px = board_x + col * self.square_size
-                    if self.game.player_color == chess.WHITE:
-                        py = board_y + (7 - row) * self.square_size
-                    else:
-                        py = board_y + row * self.square_size
-                    self.screen.blit(self.pieces[piece.symbol()], (px, py))
+        # Draw board squares, labels, highlights and pieces: one blit of a
+        # layer that is only recomposed when something on it changes
+        self.screen.blit(self.board_layer(), (board_x - 20, board_y))
 
         # Draw a dragged piece, if any
         if self.dragging and self.drag_piece:
+            half = self.square_size // 2
             dx, dy = self.drag_pos
-            dx -= self.square_size // 2
-            dy -= self.square_size // 2
-            self.screen.blit(self.pieces[self.drag_piece.symbol()], (dx, dy))
+            self.drag_rect = self.screen.blit(self.pieces[self.drag_piece.symbol()], (dx - half, dy - half))
+        else:
+            self.drag_rect = None
 
         # Draw all UI chrome
         self.draw_ui(board_x, board_y)
@@ -408,7 +662,7 @@ class ChessGUI:
         pygame.draw.rect(self.screen, (240, 240, 240), (x, y, w, h))
         pygame.draw.rect(self.screen, colour, (x, y, w, h), 2)
 
-        rendered = self.bold_font.render(text, True, colour)
+        rendered = self.render_text(text, self.bold_font, colour)
         self.screen.blit(rendered, (x + (w - rendered.get_width()) // 2,
                                     y + (h - rendered.get_height()) // 2))
 
@@ -425,22 +679,43 @@ class ChessGUI:
             rect = pygame.Rect(tab_x + i * tab_width, tab_y, tab_width, tab_height)
             colour = (200, 200, 200) if self.current_tab == name else (170, 170, 170)
             pygame.draw.rect(self.screen, colour, rect)
-            txt = self.font.render(label, True, (0, 0, 0))
+            txt = self.render_text(label)
             self.screen.blit(txt, (rect.centerx - txt.get_width() // 2,
                                    rect.centery - txt.get_height() // 2))
 
         # tab content box
         content_x, content_y = tab_x, tab_y + tab_height
         content_w, content_h = tab_width * 3, self.board_size - tab_height
-        pygame.draw.rect(self.screen, (240, 240, 240), (content_x, content_y, content_w, content_h))
-        pygame.draw.rect(self.screen, (200, 200, 200), (content_x, content_y, content_w, content_h), 1)
-
+        content = pygame.Rect(content_x, content_y, content_w, content_h)
+        # Only the part inside the window is kept; a narrow window cuts the box off
+        visible = content.clip(self.screen.get_rect())
+
+        # The stats and analysis tabs show the same thing until the position,
+        # the history, the game state or the engines change; they are kept
+        # as a copy of the drawn box and blitted back while nothing has
+        game = self.game
         if self.current_tab == "moves":
-            self.draw_moves_tab(content_x, content_y, content_w, content_h)
-        elif self.current_tab == "analysis":
-            self.draw_analysis_tab(content_x, content_y, content_w, content_h)
+            tab_key = None
+        else:
+            tab_key = (self.current_tab, visible.size, game.board._transposition_key(),
+                       len(game.move_history), game.check_game_state(), game.ai_vs_ai_mode,
+                       game.current_ai, game.second_ai, game.graph_evaluations())
+        if tab_key is not None and tab_key == self.tab_key:
+            self.screen.blit(self.tab_surf, visible.topleft)
         else:
-            self.draw_stats_tab(content_x, content_y, content_w, content_h)
+            pygame.draw.rect(self.screen, (240, 240, 240), content)
+            pygame.draw.rect(self.screen, (200, 200, 200), content, 1)
+
+            if self.current_tab == "moves":
+                self.draw_moves_tab(content_x, content_y, content_w, content_h)
+            elif self.current_tab == "analysis":
+                self.draw_analysis_tab(content_x, content_y, content_w, content_h)
+            else:
+                self.draw_stats_tab(content_x, content_y, content_w, content_h)
+
+            if tab_key is not None:
+                self.tab_surf = self.screen.subsurface(visible).copy()
+            self.tab_key = tab_key
 
         # ── bottom control panel ───────────────────────────────────────────
         self.draw_bottom_controls(board_x, board_y)
@@ -455,32 +730,52 @@ class ChessGUI:
         • Row 2: “White: … / Black: …” – click to open picker
         • Row 3: depth +/- (only if that colour uses a depth-aware engine)
         • Row 4: “Show Thinking” toggle
+
+        The panel is rendered once into a surface and only rebuilt when the
+        engines, depths or the thinking toggle change.
         """
-        self.control_rects = {}
+        game = self.game
+        engines = game.engines
+        key = tuple((type(eng).__name__ if eng else "Human", hasattr(eng, "max_depth"))
+                    for eng in (engines[chess.WHITE], engines[chess.BLACK]))
+        key += (game.white_ai_depth, game.black_ai_depth, game.show_thinking)
+        if key != self.controls_key:
+            self.build_controls_panel()
+            self.controls_key = key
+
+        # Panel-relative hit boxes, moved to where the panel is drawn
+        origin = (board_x, board_y + self.board_size + 30)
+        self.screen.blit(self.controls_panel, origin)
+        self.control_rects = {name: r.move(origin) for name, r in self.controls_panel_rects.items()}
+
+    def build_controls_panel(self):
+        """Render the bottom control panel and its hit boxes, relative to its top-left."""
         BW, BH, GAP = 100, 30, 10
         font = self.font
+        rects = {}
+        panel = pygame.Surface((4 * BW, 4 * BH + 3 * GAP)).convert()
+        # Keyed out, so the panel only covers what it draws
+        panel.fill((240, 240, 240))
+        panel.set_colorkey((240, 240, 240), pygame.RLEACCEL)
 
         # Row 1: New Game | Undo Move | Hint
-        row0_x = board_x
-        row0_y = board_y + self.board_size + 30
+        row0_y = 0
         for i, (label, key) in enumerate([
             ("New Game", "new_game"),
             ("Undo Move", "undo"),
             ("Hint", "hint"),
         ]):
-            r = pygame.Rect(row0_x + i * (BW + GAP), row0_y, BW, BH)
-            pygame.draw.rect(self.screen, (200, 200, 200), r)
+            r = pygame.Rect(i * (BW + GAP), row0_y, BW, BH)
+            pygame.draw.rect(panel, (200, 200, 200), r)
             txt = font.render(label, True, (0, 0, 0))
-            self.screen.blit(txt,
-                             (r.centerx - txt.get_width() // 2,
-                              r.centery - txt.get_height() // 2))
-            self.control_rects[key] = r
+            panel.blit(txt,
+                       (r.centerx - txt.get_width() // 2,
+                        r.centery - txt.get_height() // 2))
+            rects[key] = r
 
         # Row 2: engine labels (White: … / Black: …)
         row1_y = row0_y + BH + GAP
         col_w = BW * 2
-        pygame.draw.rect(self.screen, (240, 240, 240),
-                         (row0_x, row1_y, col_w * 2, BH))
 
         def draw_engine_label(colour, x_off, key_hitbox):
             eng = self.game.engines[colour]
@@ -490,10 +785,9 @@ class ChessGUI:
             # shrink if too wide
             while txt.get_width() > col_w - 6:
                 txt = pygame.transform.scale(txt, (int(txt.get_width() * 0.8), txt.get_height()))
-            self.screen.blit(txt, (row0_x + x_off + 3,
-                                   row1_y + BH // 2 - txt.get_height() // 2))
-            self.control_rects[key_hitbox] = pygame.Rect(row0_x + x_off,
-                                                         row1_y, col_w, BH)
+            panel.blit(txt, (x_off + 3,
+                             row1_y + BH // 2 - txt.get_height() // 2))
+            rects[key_hitbox] = pygame.Rect(x_off, row1_y, col_w, BH)
 
         draw_engine_label(chess.WHITE, 0, "white_ai")
         draw_engine_label(chess.BLACK, col_w, "black_ai")
@@ -505,100 +799,32 @@ class ChessGUI:
             eng = self.game.engines[colour]
             if eng and hasattr(eng, "max_depth"):
                 lab = font.render(f"{prefix.capitalize()} Depth: {depth}", True, (0, 0, 0))
-                self.screen.blit(lab, (row0_x + x_off,
-                                       row2_y + BH // 2 - lab.get_height() // 2))
+                panel.blit(lab, (x_off,
+                                 row2_y + BH // 2 - lab.get_height() // 2))
                 for sym, dx, key in [("-", 10, f"{prefix}_minus"),
                                      ("+", 50, f"{prefix}_plus")]:
-                    r = pygame.Rect(row0_x + x_off + BW + dx, row2_y, 30, BH)
-                    pygame.draw.rect(self.screen, (200, 200, 200), r)
-                    self.screen.blit(font.render(sym, True, (0, 0, 0)),
-                                     (r.centerx - 4, r.centery - 8))
-                    self.control_rects[key] = r
+                    r = pygame.Rect(x_off + BW + dx, row2_y, 30, BH)
+                    pygame.draw.rect(panel, (200, 200, 200), r)
+                    panel.blit(font.render(sym, True, (0, 0, 0)),
+                               (r.centerx - 4, r.centery - 8))
+                    rects[key] = r
 
         depth_widgets(chess.WHITE, self.game.white_ai_depth, "white_depth", 0)
         depth_widgets(chess.BLACK, self.game.black_ai_depth, "black_depth", 2 * BW)
 
         # Row 4: “Show Thinking” toggle
         row3_y = row2_y + BH + GAP
-        togg = pygame.Rect(row0_x, row3_y, BW, BH)
+        togg = pygame.Rect(0, row3_y, BW, BH)
         color = (150, 200, 250) if self.game.show_thinking else (200, 200, 200)
-        pygame.draw.rect(self.screen, color, togg)
+        pygame.draw.rect(panel, color, togg)
         txt = font.render("Show Thinking", True, (0, 0, 0))
-        self.screen.blit(txt,
-                         (togg.centerx - txt.get_width() // 2,
-                          togg.centery - txt.get_height() // 2))
-        self.control_rects["toggle_thinking"] = togg
-
-        # ── row 4 ───────────────────────────────────────────────────────────────
-        row3_y = row2_y + BH + GAP
-        toggle = pygame.Rect(row0_x, row3_y, BW, BH)
-        pygame.draw.rect(self.screen,
-                         (150, 200, 250) if self.game.show_thinking else (200, 200, 200),
-                         toggle)
-        self.screen.blit(font.render("Show Thinking", True, (0, 0, 0)),
-                         (toggle.centerx - font.size("Show Thinking")[0] // 2,
-                          toggle.centery - font.size("Show Thinking")[1] // 2))
-        self.control_rects["toggle_thinking"] = toggle
-
-        def depth_widgets(colour, depth, prefix, x_off):
-            eng = self.game.engines[colour]
-            if eng and hasattr(eng, "max_depth"):
-                lab = font.render(f"{prefix.capitalize()} Depth: {depth}",
-                                  True, (0, 0, 0))
-                self.screen.blit(lab, (row0_x + x_off,
-                                  row2_y + BH // 2 - lab.get_height() // 2))
-                for sym, dx, key in [("-", 10, f"{prefix}_minus"),
-                                     ("+", 50, f"{prefix}_plus")]:
-                    r = pygame.Rect(row0_x + x_off + BW + dx, row2_y, 30, BH)
-                    pygame.draw.rect(self.screen, (200, 200, 200), r)
-                    self.screen.blit(font.render(sym, True, (0, 0, 0)),
-                                (r.centerx - 4, r.centery - 8))
-                    self.control_rects[key] = r
-
-        depth_widgets(chess.WHITE, self.game.white_ai_depth, "white_depth", 0)
-        depth_widgets(chess.BLACK, self.game.black_ai_depth, "black_depth", 2 * BW)
-
-        # ─ row 4 : show-thinking toggle ──────────────────────────────────
-        row3_y = row2_y + BH + GAP
-        toggle = pygame.Rect(row0_x, row3_y, BW, BH)
-        pygame.draw.rect(self.screen,
-                         (150, 200, 250) if self.game.show_thinking else (200, 200, 200),
-                         toggle)
-        self.screen.blit(font.render("Show Thinking", True, (0, 0, 0)),
-                    (toggle.centerx - font.size("Show Thinking")[0] // 2,
-                     toggle.centery - font.size("Show Thinking")[1] // 2))
-        self.control_rects["toggle_thinking"] = toggle
-
-        def depth_widgets(colour, depth, prefix, x_off):
-            eng = self.game.engines[colour]
-            if eng and hasattr(eng, "max_depth"):
-                lab = font.render(f"{prefix.capitalize()} Depth: {depth}", True, (0, 0, 0))
-                self.screen.blit(lab, (row0_x + x_off,
-                                       row2_y + BH // 2 - lab.get_height() // 2))
-                for sym, dx, key in [("-", 10, f"{prefix}_minus"),
-                                     ("+", 50, f"{prefix}_plus")]:
-                    r = pygame.Rect(row0_x + x_off + BW + dx, row2_y, 30, BH)
-                    pygame.draw.rect(self.screen, (200, 200, 200), r)
-                    self.screen.blit(font.render(sym, True, (0, 0, 0)),
-                                     (r.centerx - 4, r.centery - 8))
-                    self.control_rects[key] = r
-
-        depth_widgets(chess.WHITE, self.game.white_ai_depth, "white_depth", 0)
-        depth_widgets(chess.BLACK, self.game.black_ai_depth, "black_depth", 2 * BW)
-
-        # ── Row 4 : show-thinking toggle ─────────────────────────────────────
-        row3_y = row2_y + BH + GAP
-        toggle = pygame.Rect(row0_x, row3_y, BW, BH)
-        pygame.draw.rect(self.screen,
-                         (150, 200, 250) if self.game.show_thinking else (200, 200, 200),
-                         toggle)
-        self.screen.blit(font.render("Show Thinking", True, (0, 0, 0)),
-                         (toggle.centerx - font.size("Show Thinking")[0] // 2,
-                          toggle.centery - font.size("Show Thinking")[1] // 2))
-        self.control_rects["toggle_thinking"] = toggle
-
-        # helper
+        panel.blit(txt,
+                   (togg.centerx - txt.get_width() // 2,
+                    togg.centery - txt.get_height() // 2))
+        rects["toggle_thinking"] = togg
 
+        self.controls_panel = panel
+        self.controls_panel_rects = rects
 
     def draw_moves_tab(self, x, y, width, height):
         """Draw the moves history tab"""
@@ -608,69 +834,68 @@ class ChessGUI:
         move_x_black = x + width // 2
         
         # Title
-        title_text = self.font.render("Move History", True, (0, 0, 0))
+        title_text = self.render_text("Move History")
         self.screen.blit(title_text, (x + width//2 - title_text.get_width()//2, move_y))
         move_y += 30
         
         # Column headers
-        white_header = self.font.render("White", True, (0, 0, 0))
-        black_header = self.font.render("Black", True, (0, 0, 0))
+        white_header = self.render_text("White")
+        black_header = self.render_text("Black")
         self.screen.blit(white_header, (move_x_white, move_y))
         self.screen.blit(black_header, (move_x_black, move_y))
         move_y += 25
         
-        # Moves
-        for i in range(0, len(self.game.move_history), 2):
+        # Moves; the number and SAN surfaces come from the text cache, so a
+        # move is only rasterised the first time it is shown
+        self.game.fill_move_sans()
+        history = self.game.move_history
+        render_text = self.render_text
+        text_blits = []
+        for i in range(0, len(history), 2):
             # Move number
             move_num = i // 2 + 1
-            move_num_text = self.font.render(f"{move_num}.", True, (0, 0, 0))
-            self.screen.blit(move_num_text, (move_x_white - 25, move_y))
+            text_blits.append((render_text(f"{move_num}."), (move_x_white - 25, move_y)))
             
             # White's move
-            white_move, white_san = self.game.move_history[i]
-            white_move_text = self.font.render(white_san, True, (0, 0, 0))
-            self.screen.blit(white_move_text, (move_x_white, move_y))
+            white_move, white_san = history[i]
+            text_blits.append((render_text(white_san), (move_x_white, move_y)))
             
             # Black's move (if exists)
-            if i + 1 < len(self.game.move_history):
-                black_move, black_san = self.game.move_history[i + 1]
-                black_move_text = self.font.render(black_san, True, (0, 0, 0))
-                self.screen.blit(black_move_text, (move_x_black, move_y))
+            if i + 1 < len(history):
+                black_move, black_san = history[i + 1]
+                text_blits.append((render_text(black_san), (move_x_black, move_y)))
             
             move_y += 20
             
             # Stop if we run out of space
             if move_y > y + height - 20:
                 break
+        self.screen.blits(text_blits, doreturn=False)
     
     def draw_analysis_tab(self, x, y, width, height):
         """Draw the position analysis tab"""
         # Title
-        title_text = self.font.render("Position Analysis", True, (0, 0, 0))
-        self.screen.blit(title_text, (x + width//2 - title_text.get_width()//2, y + 10))
-        
-        # Current evaluation
-        eval_text = self.font.render(f"Evaluation: {self.game.evaluator.evaluate(self.game.board):.2f}", True, (0, 0, 0))
-        self.screen.blit(eval_text, (x + 10, y + 40))
-        
-        # Material count
-        material_text = self.font.render(f"Material: {self.game.material_evaluator.evaluate(self.game.board):.2f}", True, (0, 0, 0))
-        self.screen.blit(material_text, (x + 10, y + 60))
+        title_text = self.render_text("Position Analysis")
+        seq = [(title_text, (x + width//2 - title_text.get_width()//2, y + 10))]
         
-        # Position quality
-        position_text = self.font.render(f"Position: {self.game.positional_evaluator.evaluate(self.game.board):.2f}", True, (0, 0, 0))
-        self.screen.blit(position_text, (x + 10, y + 80))
-        
-        # Mobility
-        mobility_text = self.font.render(f"Mobility: {self.game.mobility_evaluator.evaluate(self.game.board):.2f}", True, (0, 0, 0))
-        self.screen.blit(mobility_text, (x + 10, y + 100))
-        
-        # King safety
-        king_safety_text = self.font.render(f"King Safety: {self.game.king_safety_evaluator.evaluate(self.game.board):.2f}", True, (0, 0, 0))
-        self.screen.blit(king_safety_text, (x + 10, y + 120))
+        # The evaluator lines only change with the position, so they are
+        # worked out once per position rather than every frame
+        board = self.game.board
+        key = board._transposition_key()
+        if key != self.analysis_key:
+            # Current evaluation, then the cached per-term breakdown; both
+            # are read-only, the graph keeps its incremental scores
+            self.analysis_lines = [f"Evaluation: {self.game.evaluator.evaluate(board):.2f}"]
+            self.analysis_lines.extend(f"{label}: {evaluator.evaluate(board):.2f}"
+                                       for label, evaluator in self.game.analysis_evaluators)
+            self.analysis_key = key
+        seq.extend((self.render_text(line), (x + 10, y + 40 + 20 * i))
+                   for i, line in enumerate(self.analysis_lines))
+        self.screen.blits(seq, doreturn=False)
         
         # Draw evaluation graph if we have enough data
-        if len(self.game.position_evaluations) > 1:
+        evaluations = self.game.graph_evaluations()
+        if len(evaluations) > 1:
             graph_x = x + 10
             graph_y = y + 150
             graph_width = width - 20
@@ -684,111 +909,108 @@ class ChessGUI:
             center_y = graph_y + graph_height // 2
             pygame.draw.line(self.screen, (200, 200, 200), (graph_x, center_y), (graph_x + graph_width, center_y))
             
-            # Draw evaluation line
-            max_eval = max(abs(min(self.game.position_evaluations)), abs(max(self.game.position_evaluations)), 3.0)
-            scale = (graph_height / 2) / max_eval
-            
-            for i in range(1, len(self.game.position_evaluations)):
-                prev_eval = self.game.position_evaluations[i-1]
-                curr_eval = self.game.position_evaluations[i]
-                
-                prev_x = graph_x + (i-1) * graph_width / (len(self.game.position_evaluations) - 1)
-                curr_x = graph_x + i * graph_width / (len(self.game.position_evaluations) - 1)
-                
-                prev_y = center_y - prev_eval * scale
-                curr_y = center_y - curr_eval * scale
-                
-                pygame.draw.line(self.screen, (0, 0, 255), (prev_x, prev_y), (curr_x, curr_y), 2)
+            # Draw evaluation line; the points only change when a new
+            # evaluation comes in, so they are scaled once and then drawn
+            # as a single polyline
+            rect = (graph_x, center_y, graph_width, graph_height)
+            src_evals, src_rect = self.graph_src
+            if src_evals is not evaluations or src_rect != rect:
+                max_eval = max(-min(evaluations), max(evaluations), 3.0)
+                scale = (graph_height / 2) / max_eval
+                step = graph_width / (len(evaluations) - 1)
+                self.graph_points = [(graph_x + i * step, center_y - ev * scale)
+                                     for i, ev in enumerate(evaluations)]
+                self.graph_src = (evaluations, rect)
+            pygame.draw.lines(self.screen, (0, 0, 255), False, self.graph_points, 2)
     
     def draw_stats_tab(self, x, y, width, height):
         """Draw the game statistics tab"""
+        game = self.game
+        board = game.board
+        render_text = self.render_text
+
         # Title
-        title_text = self.font.render("Game Statistics", True, (0, 0, 0))
-        self.screen.blit(title_text, (x + width//2 - title_text.get_width()//2, y + 10))
+        title_text = render_text("Game Statistics")
+        seq = [(title_text, (x + width//2 - title_text.get_width()//2, y + 10))]
         
         # Game info
-        moves_text = self.font.render(f"Total Moves: {len(self.game.move_history)}", True, (0, 0, 0))
-        self.screen.blit(moves_text, (x + 10, y + 40))
+        lines = [f"Total Moves: {len(game.move_history)}"]
         
-        # Calculate piece counts
-        white_pieces = sum(1 for square in chess.SQUARES if self.game.board.piece_at(square) and self.game.board.piece_at(square).color == chess.WHITE)
-        black_pieces = sum(1 for square in chess.SQUARES if self.game.board.piece_at(square) and self.game.board.piece_at(square).color == chess.BLACK)
-        
-        white_text = self.font.render(f"White Pieces: {white_pieces}", True, (0, 0, 0))
-        self.screen.blit(white_text, (x + 10, y + 60))
-        
-        black_text = self.font.render(f"Black Pieces: {black_pieces}", True, (0, 0, 0))
-        self.screen.blit(black_text, (x + 10, y + 80))
+        # Calculate piece counts straight off the colour bitboards
+        white_pieces = chess.popcount(board.occupied_co[chess.WHITE])
+        black_pieces = chess.popcount(board.occupied_co[chess.BLACK])
+        lines.append(f"White Pieces: {white_pieces}")
+        lines.append(f"Black Pieces: {black_pieces}")
         
         # Game status
-        status = self.game.check_game_state()
-        if status:
-            status_text = self.font.render(f"Game Status: {status.capitalize()}", True, (0, 0, 0))
-        else:
-            turn = "White" if self.game.board.turn == chess.WHITE else "Black"
-            status_text = self.font.render(f"Game Status: {turn} to move", True, (0, 0, 0))
-        self.screen.blit(status_text, (x + 10, y + 100))
+        status = game.check_game_state()
+        lines.append(GAME_STATUS_LINES[status] if status else TURN_STATUS_LINES[board.turn])
         
         # Check status
-        check_status = "In check" if self.game.board.is_check() else "Not in check"
-        check_text = self.font.render(f"Check Status: {check_status}", True, (0, 0, 0))
-        self.screen.blit(check_text, (x + 10, y + 120))
-        
-        # Castling rights
-        castling = []
-        if self.game.board.has_kingside_castling_rights(chess.WHITE):
-            castling.append("White O-O")
-        if self.game.board.has_queenside_castling_rights(chess.WHITE):
-            castling.append("White O-O-O")
-        if self.game.board.has_kingside_castling_rights(chess.BLACK):
-            castling.append("Black O-O")
-        if self.game.board.has_queenside_castling_rights(chess.BLACK):
-            castling.append("Black O-O-O")
+        lines.append(CHECK_STATUS_LINES[board.is_check()])
         
-        castling_text = self.font.render(f"Castling Rights: {', '.join(castling) if castling else 'None'}", True, (0, 0, 0))
-        self.screen.blit(castling_text, (x + 10, y + 140))
+        # Castling rights: one lookup on the corner rooks that may still castle
+        lines.append(CASTLING_RIGHTS_LINES[board.clean_castling_rights() & chess.BB_CORNERS])
         
         # Legal moves count
-        legal_moves_count = len(list(self.game.board.legal_moves))
-        legal_moves_text = self.font.render(f"Legal Moves: {legal_moves_count}", True, (0, 0, 0))
-        self.screen.blit(legal_moves_text, (x + 10, y + 160))
+        legal_moves_count = len(game._legal_set())
+        lines.append(f"Legal Moves: {legal_moves_count}")
+
+        seq.extend((render_text(line), (x + 10, y + 40 + 20 * i)) for i, line in enumerate(lines))
         
         # AI info if in AI vs AI mode
-        if self.game.ai_vs_ai_mode:
-            ai_text = self.font.render("AI vs AI Mode:", True, (0, 0, 128))
-            self.screen.blit(ai_text, (x + 10, y + 180))
+        if game.ai_vs_ai_mode:
+            seq.append((render_text("AI vs AI Mode:", colour=(0, 0, 128)), (x + 10, y + 180)))
             
-            white_ai = next((k for k, v in self.game.ai_algorithms.items() if v == self.game.current_ai), "Custom")
-            black_ai = next((k for k, v in self.game.ai_algorithms.items() if v == self.game.second_ai), "Custom")
+            # Engines rebuilt at another depth are no longer registered by name
+            white_ai = game._ai_names.get(game.current_ai, "Custom")
+            black_ai = game._ai_names.get(game.second_ai, "Custom")
             
-            white_ai_text = self.font.render(f"White AI: {white_ai}", True, (0, 0, 0))
-            self.screen.blit(white_ai_text, (x + 20, y + 200))
-            
-            black_ai_text = self.font.render(f"Black AI: {black_ai}", True, (0, 0, 0))
-            self.screen.blit(black_ai_text, (x + 20, y + 220))
+            seq.append((render_text(f"White AI: {white_ai}"), (x + 20, y + 200)))
+            seq.append((render_text(f"Black AI: {black_ai}"), (x + 20, y + 220)))
+
+        # All of the tab's text goes out in one call
+        self.screen.blits(seq, doreturn=False)
+
+    def build_game_over_box(self):
+        """Render the Game Over box, less its result line, and its button hit boxes, relative to its top-left."""
+        box_width, box_height = 300, 150
+        box = pygame.Surface((box_width, box_height)).convert()
+        box.fill((240, 240, 240))
+        pygame.draw.rect(box, (0, 0, 0), (0, 0, box_width, box_height), 2)
+
+        # Title
+        title_text = self.render_text("Game Over", self.large_font)
+        box.blit(title_text, (box_width // 2 - title_text.get_width() // 2, 20))
+
+        # Buttons: New Game and Close
+        button_width, button_height = 120, 30
+        gap = 10
+        start_x = (box_width - (button_width * 2 + gap)) // 2
+        rects = {}
+        for i, (label, key) in enumerate([("New Game", "new_game"), ("Close", "close")]):
+            r = pygame.Rect(start_x + i * (button_width + gap), 100, button_width, button_height)
+            pygame.draw.rect(box, (200, 200, 200), r)
+            txt = self.render_text(label)
+            box.blit(txt, (r.centerx - txt.get_width() // 2,
+                           r.centery - txt.get_height() // 2))
+            rects[key] = r
+        return box, rects
 
     def draw_game_over_message(self):
         """Draw game over message"""
         status = self.game.check_game_state()
         if status:
             # Semi-transparent full-screen overlay
-            overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 128))
-            self.screen.blit(overlay, (0, 0))
+            self.dim_screen(128)
 
-            # Message box
-            box_width, box_height = 300, 150
+            # Message box, built the first time it is needed
+            if self.game_over_box is None:
+                self.game_over_box, self.game_over_box_rects = self.build_game_over_box()
+            box_width = self.game_over_box.get_width()
             box_x = (self.width - box_width) // 2
-            box_y = (self.height - box_height) // 2
-
-            pygame.draw.rect(self.screen, (240, 240, 240), (box_x, box_y, box_width, box_height))
-            pygame.draw.rect(self.screen, (0, 0, 0), (box_x, box_y, box_width, box_height), 2)
-
-            # Title
-            title_text = self.large_font.render("Game Over", True, (0, 0, 0))
-            self.screen.blit(title_text,
-                             (box_x + box_width // 2 - title_text.get_width() // 2,
-                              box_y + 20))
+            box_y = (self.height - self.game_over_box.get_height()) // 2
+            self.screen.blit(self.game_over_box, (box_x, box_y))
 
             # Result line
             if status == "checkmate":
@@ -796,92 +1018,80 @@ class ChessGUI:
                 result_line = f"{winner} wins by checkmate!"
             else:
                 result_line = f"Draw by {status}!"
-            result_text = self.font.render(result_line, True, (0, 0, 0))
+            result_text = self.render_text(result_line)
             self.screen.blit(result_text,
                              (box_x + box_width // 2 - result_text.get_width() // 2,
                               box_y + 60))
 
-            # Buttons: New Game and Close
-            button_width, button_height = 120, 30
-            gap = 10
-            total_width = button_width * 2 + gap
-            start_x = box_x + (box_width - total_width) // 2
-            button_y = box_y + 100
-
-            # New Game button
-            self.game_over_button_rect = pygame.Rect(start_x, button_y, button_width, button_height)
-            pygame.draw.rect(self.screen, (200, 200, 200), self.game_over_button_rect)
-            btn_txt = self.font.render("New Game", True, (0, 0, 0))
-            self.screen.blit(btn_txt,
-                             (start_x + button_width // 2 - btn_txt.get_width() // 2,
-                              button_y + button_height // 2 - btn_txt.get_height() // 2))
-
-            # Close button
-            close_x = start_x + button_width + gap
-            self.game_over_close_button_rect = pygame.Rect(close_x, button_y, button_width, button_height)
-            pygame.draw.rect(self.screen, (200, 200, 200), self.game_over_close_button_rect)
-            close_txt = self.font.render("Close", True, (0, 0, 0))
-            self.screen.blit(close_txt,
-                             (close_x + button_width // 2 - close_txt.get_width() // 2,
-                              button_y + button_height // 2 - close_txt.get_height() // 2))
+            # Button hit boxes in window coordinates
+            self.game_over_button_rect = self.game_over_box_rects["new_game"].move(box_x, box_y)
+            self.game_over_close_button_rect = self.game_over_box_rects["close"].move(box_x, box_y)
 
     def draw_thinking_message(self):
         """Black banner at the bottom while an engine is searching."""
         overlay_h = 30
-        surf = pygame.Surface((self.width, overlay_h), pygame.SRCALPHA)
-        surf.fill((0, 0, 0, 200))
-        self.screen.blit(surf, (0, self.height - overlay_h))
-
-        # Which engine is *actually* on move?
-        engine = self.game._ai_for_turn()
-        name = type(engine).__name__ if engine else "Engine"
-
-        txt = self.font.render(f"{name} is thinking…", True, (255, 255, 255))
+        self.dim_screen(200, pygame.Rect(0, self.height - overlay_h, self.width, overlay_h))
+
+        # Which engine is *actually* on move? Its banner text is rendered
+        # once per engine name
+        name = self.game._engine_name_for_turn() or "Engine"
+        txt = self.thinking_texts.get(name)
+        if txt is None:
+            txt = self.thinking_texts[name] = self.render_text(f"{name} is thinking…", colour=(255, 255, 255))
         self.screen.blit(txt,
                          (self.width // 2 - txt.get_width() // 2,
                           self.height - overlay_h // 2 - txt.get_height() // 2))
 
-    def draw_ai_selection_menu(self, board_x, board_y):
-        """Draw the AI selection menu"""
-        # Create semi-transparent overlay
-        overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))
-        self.screen.blit(overlay, (0, 0))
-        
-        # Draw menu box
+    def build_ai_menu(self, names):
+        """Render the AI selection menu and its button hit boxes, relative to its top-left."""
         menu_width, menu_height = 300, 400
-        menu_x = (self.width - menu_width) // 2
-        menu_y = (self.height - menu_height) // 2
-        
-        pygame.draw.rect(self.screen, (240, 240, 240), (menu_x, menu_y, menu_width, menu_height))
-        pygame.draw.rect(self.screen, (0, 0, 0), (menu_x, menu_y, menu_width, menu_height), 2)
-        
-        # Title
-        title = "Select White AI" if self.ai_target_colour == chess.WHITE else "Select Black AI"
-        title_text = self.large_font.render(title, True, (0, 0, 0))
-        self.screen.blit(title_text, (menu_x + menu_width//2 - title_text.get_width()//2, menu_y + 20))
-        
-        # AI options
+
+        # AI options, then the Cancel button
         button_height = 30
         button_width = menu_width - 40
-        button_x = menu_x + 20
-        button_y = menu_y + 60
-
-        ai_names = list(self.game.ai_algorithms.keys()) + ["Human"]  # ← NEW
-        for i, ai_name in enumerate(ai_names):
-            pygame.draw.rect(self.screen, (200, 200, 200),
-                             (button_x, button_y + i * (button_height + 5),
-                              button_width, button_height))
-            txt = self.font.render(ai_name, True, (0, 0, 0))
-            self.screen.blit(txt, (button_x + button_width // 2 - txt.get_width() // 2,
-                                   button_y + i * (button_height + 5) + button_height // 2 - txt.get_height() // 2))
-
-        # Cancel button
-        cancel_y = menu_y + menu_height - 50
-        pygame.draw.rect(self.screen, (200, 200, 200), (button_x, cancel_y, button_width, button_height))
-        cancel_text = self.font.render("Cancel", True, (0, 0, 0))
-        self.screen.blit(cancel_text, (button_x + button_width//2 - cancel_text.get_width()//2, 
-                                      cancel_y + button_height//2 - cancel_text.get_height()//2))
+        buttons = [(name, pygame.Rect(20, 60 + i * (button_height + 5), button_width, button_height))
+                   for i, name in enumerate(names)]
+        buttons.append(("Cancel", pygame.Rect(20, menu_height - 50, button_width, button_height)))
+
+        # A long engine list runs past the bottom of the box, so the surface
+        # is see-through wherever the box itself isn't
+        height = max(menu_height, max(r.bottom for _, r in buttons))
+        menu = pygame.Surface((menu_width, height), pygame.SRCALPHA).convert_alpha()
+        menu.fill((0, 0, 0, 0))
+        pygame.draw.rect(menu, (240, 240, 240), (0, 0, menu_width, menu_height))
+        pygame.draw.rect(menu, (0, 0, 0), (0, 0, menu_width, menu_height), 2)
+
+        # Title
+        title = "Select White AI" if self.ai_target_colour == chess.WHITE else "Select Black AI"
+        title_text = self.render_text(title, self.large_font)
+        menu.blit(title_text, (menu_width//2 - title_text.get_width()//2, 20))
+
+        rects = {}
+        for label, r in buttons:
+            pygame.draw.rect(menu, (200, 200, 200), r)
+            txt = self.render_text(label)
+            menu.blit(txt, (r.centerx - txt.get_width() // 2,
+                            r.centery - txt.get_height() // 2))
+            rects[label] = r
+        return menu, rects
+
+    def draw_ai_selection_menu(self, board_x, board_y):
+        """Draw the AI selection menu"""
+        # Create semi-transparent overlay
+        self.dim_screen(128)
+
+        # The menu only changes with the colour it is for and the engine list
+        names = tuple(self.game.ai_algorithms) + ("Human",)
+        key = (self.ai_target_colour, names)
+        if key != self.ai_menu_key:
+            self.ai_menu_surf, self.ai_menu_rects = self.build_ai_menu(names)
+            self.ai_menu_key = key
+
+        # Centred on the 300x400 box, not on the (possibly taller) surface
+        menu_x = (self.width - 300) // 2
+        menu_y = (self.height - 400) // 2
+        self.screen.blit(self.ai_menu_surf, (menu_x, menu_y))
+        self.ai_menu_origin = (menu_x, menu_y)
 
 
     # ────────────────────────────────────────────────────────────────────────────
@@ -965,7 +1175,7 @@ class ChessGUI:
                     self.legal_moves = []
                     self.show_hint = False
 
-                    if move in self.game.board.legal_moves:
+                    if move in self.game._legal_set():
                         self.game.make_move(move)
                     return
             # If they clicked anywhere else while popup is up, just eat the click
@@ -984,10 +1194,7 @@ class ChessGUI:
             return
 
         # ——— Click on the board? ——————————————————————————————
-        board_x = (self.width - self.board_size) // 2
-        board_y = 50
-        if (board_x <= event.pos[0] <= board_x + self.board_size and
-                board_y <= event.pos[1] <= board_y + self.board_size):
+        if self.board_rect.collidepoint(event.pos):
 
             # disabled in AI-vs-AI mode
             if self.game.ai_vs_ai_mode:
@@ -998,18 +1205,14 @@ class ChessGUI:
                 return
 
             # … existing logic to pick up / drop pieces …
-            col = (event.pos[0] - board_x) // self.square_size
-            row = (event.pos[1] - board_y) // self.square_size
-            if self.game.player_color == chess.BLACK:
-                square = row * 8 + col
-            else:
-                square = (7 - row) * 8 + col
+            square = self.square_at(event.pos)
 
             piece = self.game.board.piece_at(square)
             if piece and piece.color == self.game.board.turn:
                 self.selected_square = square
+                self.selected_piece = piece
                 self.legal_moves = [
-                    m for m in self.game.board.legal_moves
+                    m for m in self.game._legal_set()
                     if m.from_square == square
                 ]
                 self.dragging = False
@@ -1017,18 +1220,11 @@ class ChessGUI:
                 return
 
             if self.selected_square is not None:
-                pawn = self.game.board.piece_at(self.selected_square)
-                promo = None
                 # detect promotion
-                if pawn and pawn.piece_type == chess.PAWN:
-                    tgt_rank = square // 8
-                    if pawn.color == chess.WHITE and tgt_rank == 7:
-                        promo = chess.QUEEN
-                    elif pawn.color == chess.BLACK and tgt_rank == 0:
-                        promo = chess.QUEEN
+                promo = chess.QUEEN if self.promotes_on(square) else None
 
                 move = chess.Move(self.selected_square, square, promotion=promo)
-                if move in self.game.board.legal_moves:
+                if move in self.game._legal_set():
                     if promo and promo == chess.QUEEN:
                         self.pending_promotion_move = (self.selected_square, square)
                         self.show_promotion_menu = True
@@ -1045,8 +1241,8 @@ class ChessGUI:
 
         # ——— Click on side-tabs? ——————————————————————————————
         tab_w, tab_h = 100, 30
-        tab_x = board_x + self.board_size + 20
-        tab_y = board_y
+        tab_x = self.board_rect.x + self.board_size + 20
+        tab_y = self.board_rect.y
         if tab_y <= event.pos[1] <= tab_y + tab_h:
             idx = (event.pos[0] - tab_x) // tab_w
             self.current_tab = ["moves", "analysis", "stats"][max(0, min(idx, 2))]
@@ -1070,45 +1266,34 @@ class ChessGUI:
         if event.button != 1:  # left mouse button only
             return
 
-        # Menu geometry
-        menu_w, menu_h = 300, 400
-        menu_x = (self.width - menu_w) // 2
-        menu_y = (self.height - menu_h) // 2
-
-        btn_h = 30
-        btn_w = menu_w - 40
-        btn_x = menu_x + 20
-        btn_y0 = menu_y + 60
+        # Hit boxes are kept relative to the menu's top-left by draw_ai_selection_menu
+        x = event.pos[0] - self.ai_menu_origin[0]
+        y = event.pos[1] - self.ai_menu_origin[1]
 
-        # List of names in the exact same order you draw them
-        names = list(self.game.ai_algorithms.keys()) + ["Human"]
+        # 1) Click on one of the engine choices, or on "Cancel"? They are
+        # checked in the order they were drawn
+        for name, rect in self.ai_menu_rects.items():
+            if rect.collidepoint(x, y):
+                if name != "Cancel":
+                    # pick the engine (None for Human)
+                    engine = None if name == "Human" else self.game._get_ai(name)
 
-        # 1) Click on one of the engine choices?
-        for i, name in enumerate(names):
-            y1 = btn_y0 + i * (btn_h + 5)
-            if btn_x <= event.pos[0] <= btn_x + btn_w and \
-                    y1 <= event.pos[1] <= y1 + btn_h:
-                # pick the engine (None for Human)
-                engine = None if name == "Human" else self.game.ai_algorithms[name]
-
-                # update the game’s engine assignment
-                self.game.set_engine_for_colour(self.ai_target_colour, engine)
+                    # update the game’s engine assignment
+                    self.game.set_engine_for_colour(self.ai_target_colour, engine)
 
                 # close the menu at once
                 self.show_ai_menu = False
                 return
 
-        # 2) Click on “Cancel”?
-        cancel_y = menu_y + menu_h - 50
-        if btn_x <= event.pos[0] <= btn_x + btn_w and \
-                cancel_y <= event.pos[1] <= cancel_y + btn_h:
+        # 2) Click outside the menu → close it
+        if not pygame.Rect(0, 0, 300, 400).collidepoint(x, y):
             self.show_ai_menu = False
-            return
 
-        # 3) Click outside the menu → close it
-        if not (menu_x <= event.pos[0] <= menu_x + menu_w and
-                menu_y <= event.pos[1] <= menu_y + menu_h):
-            self.show_ai_menu = False
+    def promotes_on(self, square):
+        """Whether the selected piece is a pawn reaching its last rank on square"""
+        piece = self.selected_piece
+        return (piece is not None and piece.piece_type == chess.PAWN and
+                chess.square_rank(square) == (7 if piece.color == chess.WHITE else 0))
 
     def handle_mouse_up(self, event):
         """Handle mouse button up events (finish drag-and-drop or promotion)"""
@@ -1121,33 +1306,14 @@ class ChessGUI:
 
         # 1) finish a drag-and-drop
         if self.dragging and self.selected_square is not None:
-            board_x = (self.width - self.board_size) // 2
-            board_y = 50
-
             # did we release on the board?
-            if (board_x <= event.pos[0] <= board_x + self.board_size and
-                board_y <= event.pos[1] <= board_y + self.board_size):
+            if self.board_rect.collidepoint(event.pos):
 
                 # pixel → square index
-                col = (event.pos[0] - board_x) // self.square_size
-                row = (event.pos[1] - board_y) // self.square_size
-                if self.game.player_color == chess.BLACK:
-                    square = row * 8 + col
-                else:
-                    square = (7 - row) * 8 + col
-
-                pawn = self.game.board.piece_at(self.selected_square)
-                promo = None
-                # detect promotion
-                if pawn and pawn.piece_type == chess.PAWN:
-                    target_rank = square // 8
-                    if pawn.color == chess.WHITE and target_rank == 7:
-                        promo = chess.QUEEN
-                    elif pawn.color == chess.BLACK and target_rank == 0:
-                        promo = chess.QUEEN
+                square = self.square_at(event.pos)
 
                 # if promotion, open menu
-                if promo:
+                if self.promotes_on(square):
                     self.pending_promotion_move = (self.selected_square, square)
                     self.show_promotion_menu = True
                     # skip executing move until choice made
@@ -1156,24 +1322,9 @@ class ChessGUI:
 
                 # otherwise normal move
                 move = chess.Move(self.selected_square, square)
-                if move in self.game.board.legal_moves:
-                    # play sounds
-                    if self.game.board.is_capture(move):
-                        self.play_sound('capture')
-                    elif self.game.board.is_castling(move):
-                        self.play_sound('castle')
-                    elif move.promotion:
-                        self.play_sound('promote')
-                    else:
-                        self.play_sound('move')
-
+                if move in self.game._legal_set():
+                    # make_move plays the sounds
                     self.game.make_move(move)
-
-                    if self.game.board.is_check():
-                        self.play_sound('check')
-                    if self.game.game_over:
-                        self.play_sound('game_end')
-
                     self.show_hint = False
 
             # reset drag state
@@ -1188,7 +1339,7 @@ class ChessGUI:
         if self.selected_square is not None and event.buttons[0]:
             if not self.dragging:
                 self.dragging = True
-                self.drag_piece = self.game.board.piece_at(self.selected_square)
+                self.drag_piece = self.selected_piece
             self.drag_pos = event.pos
     
     def handle_key_press(self, event):
@@ -1234,15 +1385,31 @@ class ChessGUI:
             self.show_hint = not self.show_hint
 
             if self.show_hint:
-                # pull the InsaneModeAI instance from the game's registry
-                insane_ai = self.game.ai_algorithms["Advanced Mode AI (4)"]
+                # a dedicated Advanced Mode AI (4): the registry's instance may
+                # be searching on the AI worker thread right now
+                insane_ai = self.game._hint_ai()
                 # compute and store the hint move
                 self.hint_move = insane_ai.get_best_move(self.game.board)
 
+    def sound(self, sound_type):
+        """The Sound for sound_type, loaded on first use; None if there is no file"""
+        sound = self.sounds.get(sound_type)
+        if sound is None and sound_type in self.sound_paths:
+            try:
+                sound = pygame.mixer.Sound(self.sound_paths[sound_type])
+            except pygame.error as e:
+                print(f"Error loading sound {sound_type}: {e}")
+                # Don't try this file again
+                del self.sound_paths[sound_type]
+                return None
+            self.sounds[sound_type] = sound
+        return sound
+
     def play_sound(self, sound_type):
         """Play a sound effect if available"""
-        if sound_type in self.sounds and self.sounds[sound_type]:
+        sound = self.sound(sound_type)
+        if sound:
             try:
-                self.sounds[sound_type].play()
+                self.sound_channels[sound_type].play(sound)
             except:
                 pass  # Silently fail if sound can't be played
@@ -3,44 +3,79 @@
 import chess
 import math
 
+# The king's square and the (up to) eight around it, by king square
+KING_ZONES = [chess.BB_KING_ATTACKS[square] | chess.BB_SQUARES[square] for square in chess.SQUARES]
+# The three squares in front of a king (fewer on the edge files, none on its
+# last rank), indexed [color][king square]
+PAWN_SHIELDS = tuple(
+    [chess.BB_KING_ATTACKS[square] & chess.BB_RANKS[chess.square_rank(square) + step]
+     if 0 <= chess.square_rank(square) + step < 8 else 0
+     for square in chess.SQUARES]
+    for step in (-1, 1)
+)
+# The file masks of a king's file and the files beside it, by king file
+ADJACENT_FILES = tuple(tuple(chess.BB_FILES[file] for file in range(max(0, king_file - 1), min(8, king_file + 2)))
+                       for king_file in range(8))
+# Pawn-structure entries KingSafetyEvaluator keeps before starting over
+PAWN_CACHE_SIZE = 100000
+# Most squares one piece can attack, by piece type
+MAX_ATTACKS = (None, 2, 8, 13, 14, 27, 8)
+
 class Evaluator:
     def evaluate(self, board):
-        raise NotImplementedError("Subclasses must implement evaluate")
+        # Finished games score the same under every evaluator; only positions
+        # still in play reach evaluate_position
+        score = self.terminal_score(board)
+        if score is None:
+            score = self.evaluate_position(board)
+        return score
 
+    def evaluate_position(self, board):
+        raise NotImplementedError("Subclasses must implement evaluate_position")
 
-class MaterialEvaluator(Evaluator):
+    def evaluate_within(self, board, alpha, beta):
+        # May settle for a bound once the score is known to fall outside
+        # (alpha, beta); returns (score, exact). Scored in full by default
+        return self.evaluate(board), True
 
-    def __init__(self):
-        self.piece_values = {
-            chess.PAWN: 100,
-            chess.KNIGHT: 320,
-            chess.BISHOP: 330,
-            chess.ROOK: 500,
-            chess.QUEEN: 900,
-            chess.KING: 20000
-        }
-    
-    def evaluate(self, board):
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
-        
-        if board.is_stalemate() or board.is_insufficient_material():
+    def score_bound(self, board):
+        # Largest magnitude evaluate_position can return for this board
+        return math.inf
+
+    def terminal_score(self, board):
+        # One probe for a legal move settles both checkmate and stalemate
+        if not any(board.generate_legal_moves()):
+            if board.is_check():
+                return -10000 if board.turn == chess.WHITE else 10000
             return 0
         
-        white_material = 0
-        black_material = 0
-        
-        # Count material for each side
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                value = self.piece_values[piece.piece_type]
-                if piece.color == chess.WHITE:
-                    white_material += value
-                else:
-                    black_material += value
+        if board.is_insufficient_material():
+            return 0
         
-        return white_material - black_material
+        return None
+
+
+class MaterialEvaluator(Evaluator):
+
+    def __init__(self):
+        # Indexed by piece type: pawn, knight, bishop, rook, queen, king
+        self.piece_values = (None, 100, 320, 330, 500, 900, 20000)
+    
+    def evaluate_position(self, board):
+        white = board.occupied_co[chess.WHITE]
+        black = board.occupied_co[chess.BLACK]
+        piece_values = self.piece_values
+        material = 0
+        
+        # Count material for each side off the piece bitboards; the kings,
+        # one a side, cancel out
+        for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                   (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                   (chess.QUEEN, board.queens)):
+            material += piece_values[piece_type] * (chess.popcount(pieces & white) -
+                                                    chess.popcount(pieces & black))
+        
+        return material
 
 
 class PositionalEvaluator(Evaluator):
@@ -124,106 +159,119 @@ class PositionalEvaluator(Evaluator):
             -50,-30,-30,-30,-30,-30,-30,-50
         ]
         
-        self.piece_tables = {
-            chess.PAWN: self.pawn_table,
-            chess.KNIGHT: self.knight_table,
-            chess.BISHOP: self.bishop_table,
-            chess.ROOK: self.rook_table,
-            chess.QUEEN: self.queen_table,
-            chess.KING: self.king_middle_table  # Default to middle game
-        }
+        # Indexed by piece type: pawn, knight, bishop, rook, queen, king
+        self.piece_tables = [
+            None,
+            self.pawn_table,
+            self.knight_table,
+            self.bishop_table,
+            self.rook_table,
+            self.queen_table,
+            self.king_middle_table  # Default to middle game
+        ]
+
+        # The same tables resolved per colour and signed for white once:
+        # square_values[is_endgame][color][piece_type][square]
+        self.square_values = (self.signed_tables(False), self.signed_tables(True))
+
+    def signed_tables(self, is_endgame):
+        tables = list(self.piece_tables)
+        if is_endgame:
+            tables[chess.KING] = self.king_end_table
+        # Indexed by colour, so black (False) comes first
+        black = (None,) + tuple(tuple(-tables[piece_type][square ^ 56] for square in chess.SQUARES)
+                                for piece_type in chess.PIECE_TYPES)
+        white = (None,) + tuple(tuple(tables[piece_type]) for piece_type in chess.PIECE_TYPES)
+        return (black, white)
     
-    def evaluate(self, board):
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
-        
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-        
-        # Determine if we're in the endgame
-        is_endgame = self.is_endgame(board)
-        
-        white_position = 0
-        black_position = 0
-        
-        # Evaluate each piece's position
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                # Get the appropriate table
-                if piece.piece_type == chess.KING and is_endgame:
-                    table = self.king_end_table
-                else:
-                    table = self.piece_tables[piece.piece_type]
-                
-                # Get the position value
-                if piece.color == chess.WHITE:
-                    position_value = table[square]
-                    white_position += position_value
-                else:
-                    # Flip the square for black's perspective
-                    position_value = table[chess.square_mirror(square)]
-                    black_position += position_value
-        
-        return white_position - black_position
+    def evaluate_position(self, board):
+        # Tables for this phase, already mirrored and negated for black
+        values = self.square_values[self.is_endgame(board)]
+        
+        position = 0
+        
+        # Evaluate each piece's position, walking the squares of each
+        # piece bitboard rather than all 64
+        for color in chess.COLORS:
+            occupied = board.occupied_co[color]
+            tables = values[color]
+            for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                       (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                       (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+                table = tables[piece_type]
+                for square in chess.scan_forward(pieces & occupied):
+                    position += table[square]
+        
+        return position
+
+    def square_value(self, piece_type, color, square, is_endgame=False):
+        # Table value of one piece on one square, from white's perspective
+        return self.square_values[bool(is_endgame)][color][piece_type][square]
     
     def is_endgame(self, board):
-        # Count the total material
-        white_material = 0
-        black_material = 0
-        
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece and piece.piece_type != chess.KING:
-                if piece.color == chess.WHITE:
-                    white_material += 1
-                else:
-                    black_material += 1
-        
-        # If either side has <= 3 non-pawn pieces, it's an endgame
+        # Count the total material straight off the bitboards
+        non_kings = ~board.kings
+        white_material = chess.popcount(board.occupied_co[chess.WHITE] & non_kings)
+        black_material = chess.popcount(board.occupied_co[chess.BLACK] & non_kings)
+        
+        # If either side has <= 3 pieces besides its king, pawns included,
+        # it's an endgame
         return white_material <= 3 or black_material <= 3
 
 
 class MobilityEvaluator(Evaluator):
 
-    def evaluate(self, board):
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
-        
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-        
-        # Save the current turn
-        original_turn = board.turn
-        
-        # Count white's mobility
-        board.turn = chess.WHITE
-        white_mobility = len(list(board.legal_moves))
-        
-        # Count black's mobility
-        board.turn = chess.BLACK
-        black_mobility = len(list(board.legal_moves))
-        
-        # Restore the original turn
-        board.turn = original_turn
+    def evaluate_position(self, board):
+        # Count each side's mobility as the squares its pieces attack that
+        # aren't occupied by its own pieces; no moves are generated and the
+        # board (turn included) is left untouched
+        white_mobility = self.attack_mobility(board, chess.WHITE)
+        black_mobility = self.attack_mobility(board, chess.BLACK)
         
         return white_mobility - black_mobility
 
+    def score_bound(self, board):
+        # Neither side can attack more than its pieces' most squares each,
+        # so the difference is at most the larger of the two
+        return max(sum(MAX_ATTACKS[piece_type] * chess.popcount(pieces & board.occupied_co[color])
+                       for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                                  (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                                  (chess.QUEEN, board.queens), (chess.KING, board.kings)))
+                   for color in chess.COLORS)
+
+    def attack_mobility(self, board, color):
+        own = board.occupied_co[color]
+        return sum(chess.popcount(board.attacks_mask(square) & ~own)
+                   for square in chess.scan_forward(own))
+
 
 class KingSafetyEvaluator(Evaluator):
 
-    def evaluate(self, board):
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
-        
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-        
+    def __init__(self):
+        # Pawn shield + open files score by (pawns, own pawns, king square):
+        # both only depend on those, and most moves leave them alone
+        self.pawn_cache = {}
+
+    def __getstate__(self):
+        # Pickled along with the engines to the root-search worker
+        # processes; they start with an empty cache of their own
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def evaluate_position(self, board):
         white_king_safety = self.evaluate_king_safety(board, chess.WHITE)
         black_king_safety = self.evaluate_king_safety(board, chess.BLACK)
         
         return white_king_safety - black_king_safety
     
+    def score_bound(self, board):
+        # Per side: check -50, open files down to -45 and king zone down to
+        # -45, against a shield of at most +30; only the side to move can
+        # be in check
+        return 170
+
     def evaluate_king_safety(self, board, color):
         """Evaluate the safety of a king"""
         king_square = board.king(color)
@@ -232,105 +280,201 @@ class KingSafetyEvaluator(Evaluator):
         
         safety = 0
         
-        # Check if the king is in check
-        if board.is_check() and board.turn == color:
+        # Check if the king is in check; only the side to move can be, so
+        # the attack test is skipped for the other king
+        if board.turn == color and board.is_check():
             safety -= 50
         
-        # Check pawn shield
-        safety += self.evaluate_pawn_shield(board, king_square, color)
-        
-        # Check open files near the king
-        safety += self.evaluate_open_files(board, king_square, color)
-        
-        # Check piece attacks near the king
-        safety += self.evaluate_piece_attacks(board, king_square, color)
+        # Check pawn shield and open files near the king, worked out once
+        # per pawn structure and king square
+        pawns = board.pawns
+        own_pawns = pawns & board.occupied_co[color]
+        key = (pawns, own_pawns, king_square)
+        pawn_safety = self.pawn_cache.get(key)
+        if pawn_safety is None:
+            if len(self.pawn_cache) >= PAWN_CACHE_SIZE:
+                self.pawn_cache.clear()
+            pawn_safety = (self.evaluate_pawn_shield(own_pawns, king_square, color) +
+                           self.evaluate_open_files(pawns, king_square))
+            self.pawn_cache[key] = pawn_safety
+        safety += pawn_safety
+        
+        # Check piece attacks near the king, against every square the
+        # enemy attacks, gathered in one pass over its pieces
+        enemy_attacks = self.attacked_squares(board, not color)
+        safety += self.evaluate_piece_attacks(king_square, enemy_attacks)
         
         return safety
     
-    def evaluate_pawn_shield(self, board, king_square, color):
-        shield_value = 0
-        
-        # Define the squares in front of the king based on color
-        if color == chess.WHITE:
-            # For white, check the squares above the king
-            shield_squares = [
-                king_square + 8,  # Directly above
-                king_square + 7,  # Diagonally left
-                king_square + 9   # Diagonally right
-            ]
-        else:
-            # For black, check the squares below the king
-            shield_squares = [
-                king_square - 8,  # Directly below
-                king_square - 7,  # Diagonally right
-                king_square - 9   # Diagonally left
-            ]
-        
-        # Check each shield square
-        for square in shield_squares:
-            if 0 <= square < 64:  # Make sure the square is on the board
-                piece = board.piece_at(square)
-                if piece and piece.piece_type == chess.PAWN and piece.color == color:
-                    shield_value += 10
-        
-        return shield_value
+    def evaluate_pawn_shield(self, own_pawns, king_square, color):
+        # 10 for each own pawn on the squares in front of the king
+        return 10 * chess.popcount(PAWN_SHIELDS[color][king_square] & own_pawns)
     
-    def evaluate_open_files(self, board, king_square, color):
+    def evaluate_open_files(self, pawns, king_square):
         file_value = 0
-        king_file = chess.square_file(king_square)
-        
-        # Check the king's file and adjacent files
-        for file in range(max(0, king_file - 1), min(8, king_file + 2)):
-            is_open = True
-            
-            # Check if there are any pawns on this file
-            for rank in range(8):
-                square = chess.square(file, rank)
-                piece = board.piece_at(square)
-                if piece and piece.piece_type == chess.PAWN:
-                    is_open = False
-                    break
-            
-            if is_open:
+        
+        # Check the king's file and adjacent files: a file is open when no
+        # pawn of either colour stands anywhere on it
+        for file_mask in ADJACENT_FILES[chess.square_file(king_square)]:
+            if not pawns & file_mask:
                 file_value -= 15  # Open file near the king is bad
         
         return file_value
     
-    def evaluate_piece_attacks(self, board, king_square, color):
-        attack_value = 0
-        enemy_color = not color
-        
-        # Define the squares around the king
-        king_rank = chess.square_rank(king_square)
-        king_file = chess.square_file(king_square)
-        
-        for rank in range(max(0, king_rank - 1), min(8, king_rank + 2)):
-            for file in range(max(0, king_file - 1), min(8, king_file + 2)):
-                square = chess.square(file, rank)
-                
-                # Check if this square is attacked by the enemy
-                if board.is_attacked_by(enemy_color, square):
-                    attack_value -= 5
-        
-        return attack_value
+    def attacked_squares(self, board, color):
+        # Union of the squares attacked by color's pieces
+        attacks = 0
+        for square in chess.scan_forward(board.occupied_co[color]):
+            attacks |= board.attacks_mask(square)
+        return attacks
+    
+    def evaluate_piece_attacks(self, king_square, enemy_attacks):
+        # Each square of the king's zone the enemy attacks costs 5
+        return -5 * chess.popcount(KING_ZONES[king_square] & enemy_attacks)
 
 
 class CompositeEvaluator(Evaluator):
 
     def __init__(self, evaluator_weights):
         self.evaluator_weights = evaluator_weights
+        # With both a material and a positional term in the mix, the two are
+        # scored together in one walk over the piece bitboards (piece_scores)
+        evaluators = [evaluator for evaluator, _ in evaluator_weights]
+        self.material = next((e for e in evaluators if type(e) is MaterialEvaluator), None)
+        self.positional = next((e for e in evaluators if type(e) is PositionalEvaluator), None)
+        self.fused = self.material is not None and self.positional is not None
     
-    def evaluate(self, board):
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
+    def evaluate_position(self, board):
+        total_score = 0
         
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
+        for score in self.weighted_scores(board):
+            total_score += score
+        
+        return total_score
+
+    def evaluate_within(self, board, alpha, beta):
+        score = self.terminal_score(board)
+        if score is not None:
+            return score, True
+        
+        # Most the terms after each one could still move the total, either way
+        terms = self.evaluator_weights
+        remaining = [0] * len(terms)
+        for i in range(len(terms) - 1, 0, -1):
+            evaluator, weight = terms[i]
+            remaining[i - 1] = remaining[i] + abs(weight) * evaluator.score_bound(board)
         
         total_score = 0
         
-        for evaluator, weight in self.evaluator_weights:
-            score = evaluator.evaluate(board)
-            total_score += score * weight
+        for score, rest in zip(self.weighted_scores(board), remaining):
+            total_score += score
+            # Stop once not even the rest of the terms could bring the score
+            # back into the window, answering with the bound it can't pass
+            if rest:
+                if total_score + rest <= alpha:
+                    return total_score + rest, False
+                if total_score - rest >= beta:
+                    return total_score - rest, False
+        
+        return total_score, True
+
+    def weighted_scores(self, board):
+        """Each term's weighted score in turn, for a position still in play"""
+        fused = self.fused
+        if fused:
+            material, position = self.piece_scores(board)
         
-        return total_score
+        for evaluator, weight in self.evaluator_weights:
+            if fused and evaluator is self.material:
+                score = material
+            elif fused and evaluator is self.positional:
+                score = position
+            else:
+                # The terminal check was made once above, not again per term
+                score = evaluator.evaluate_position(board)
+            yield score * weight
+
+    def piece_scores(self, board):
+        """The material and positional scores in a single pass over the pieces"""
+        piece_values = self.material.piece_values
+        positional = self.positional
+        values = positional.square_values[positional.is_endgame(board)]
+        
+        material = 0
+        position = 0
+        
+        for color in chess.COLORS:
+            occupied = board.occupied_co[color]
+            tables = values[color]
+            sign = 1 if color == chess.WHITE else -1
+            for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                       (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                       (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+                pieces &= occupied
+                if not pieces:
+                    continue
+                # The kings, one a side, cancel out of the material
+                if piece_type != chess.KING:
+                    material += sign * piece_values[piece_type] * chess.popcount(pieces)
+                table = tables[piece_type]
+                for square in chess.scan_forward(pieces):
+                    position += table[square]
+        
+        return material, position
+
+
+class CachedEvaluator(Evaluator):
+
+    def __init__(self, evaluator, maxsize=1 << 16):
+        # Scores are a pure function of the position, so they never go stale.
+        # Laid out like the search's TranspositionTable: maxsize (a power of
+        # two) slots, slot = key hash & mask, each holding a (key, score)
+        # pair that the next position landing there simply replaces
+        self.evaluator = evaluator
+        self.maxsize = maxsize
+        self.mask = maxsize - 1
+        self.slots = [None] * maxsize
+
+    def evaluate(self, board):
+        key, index = self.slot(board)
+
+        entry = self.slots[index]
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        score = self.evaluator.evaluate(board)
+        # Key and score go in as one tuple, so the GUI and the AI worker,
+        # which evaluate from different threads, never see them mismatched
+        self.slots[index] = (key, score)
+        return score
+
+    def evaluate_within(self, board, alpha, beta):
+        key, index = self.slot(board)
+
+        entry = self.slots[index]
+        if entry is not None and entry[0] == key:
+            return entry[1], True
+
+        score, exact = self.evaluator.evaluate_within(board, alpha, beta)
+        # A bound only holds for this window, so only exact scores are kept
+        if exact:
+            self.slots[index] = (key, score)
+        return score, exact
+
+    def slot(self, board):
+        # Boards that keep their Zobrist hash up to date on push/pop (the
+        # search's ZobristBoard) are keyed on it, others on their
+        # transposition key
+        key = getattr(board, "zkey", None)
+        if key is None:
+            key = board._transposition_key()
+            return key, hash(key) & self.mask
+        return key, key & self.mask
+
+    def __getstate__(self):
+        # Engines are pickled to the root-search worker processes; they start
+        # with an empty cache of their own
+        return {"evaluator": self.evaluator, "maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["evaluator"], state["maxsize"])